@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+# Copyright Bernardo Heynemann <heynemann@gmail.com>
+
+# Licensed under the Open Software License ("OSL") v. 3.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.opensource.org/licenses/osl-3.0.php
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from cStringIO import StringIO
+
+from libmagic import Game, Player, Deck, Card, Land, Cost, Bus, FreeForAll, run_game
+from libmagic.simulation import play_first_playable_card, mixed_deck
+from libmagic.recording import Recorder
+
+# Every case takes a scale and returns (operations, run), where run performs
+# that many operations. Workloads only depend on fixed seeds, so the same
+# scale always does the same work.
+
+COLORS = ("green", "red", "black", "white", "blue")
+
+def new_game(seed, decks):
+    game = Game(seed=seed)
+    for player_index, deck in enumerate(decks):
+        game.add_player(Player(name="Player %d" % (player_index + 1), deck=deck))
+    game.initialize()
+    return game
+
+def game_initialize(scale):
+    decks = (mixed_deck("green", 60), mixed_deck("black", 60))
+    operations = 20 * scale
+
+    def run():
+        for seed in xrange(operations):
+            new_game(seed, decks)
+    return operations, run
+
+def move_to_next_step(scale):
+    decks = (mixed_deck("green", 60), mixed_deck("black", 60))
+    game = new_game(1, decks)
+    operations = len(game.transitions) * 200 * scale
+
+    def run():
+        for step in xrange(operations):
+            game.move_to_next_step()
+    return operations, run
+
+def bus_publish_fanout(scale):
+    bus = Bus()
+    received = []
+    for subscriber in range(10):
+        bus.subscribe("some message", lambda value: received.append(value))
+    operations = 20000 * scale
+
+    def run():
+        del received[:]
+        for value in xrange(operations):
+            bus.publish("some message", value)
+    return operations, run
+
+def cost_is_satisfied_by(scale):
+    costs = [Cost(colorless=cnt % 4, **{color: 1 + cnt % 2}) for cnt, color in enumerate(COLORS * 4)]
+    pools = [dict([(color, (cnt + offset) % 3) for offset, color in enumerate(COLORS + ("colorless",))])
+                for cnt in range(10)]
+    operations = len(costs) * len(pools) * 250 * scale
+
+    def run():
+        for repeat in xrange(250 * scale):
+            for pool in pools:
+                for cost in costs:
+                    cost.is_satisfied_by(**pool)
+    return operations, run
+
+def validate_deck(scale):
+    cards = [Card("card %d" % (cnt // 4), Cost(green=1)) for cnt in range(600)]
+    cards += [Land("Forest", "green") for cnt in range(400)]
+    deck = Deck("large deck", cards)
+    game_mode = FreeForAll()
+    operations = 100 * scale
+
+    def run():
+        for repeat in xrange(operations):
+            game_mode.validate_deck(deck)
+    return operations, run
+
+def games_per_second(scale):
+    decks = (mixed_deck("green", 60), mixed_deck("red", 60))
+    operations = 20 * scale
+
+    def run():
+        for seed in xrange(operations):
+            run_game(decks, max_turns=20, seed=seed)
+    return operations, run
+
+def recorded_games_per_second(scale):
+    decks = (mixed_deck("green", 60), mixed_deck("red", 60))
+    operations = 20 * scale
+
+    def run():
+        recorder = Recorder(StringIO())
+        for seed in xrange(operations):
+            game = Game(seed=seed)
+            for player_index, deck in enumerate(decks):
+                game.add_player(Player(name="Player %d" % (player_index + 1), deck=deck), supress_validation=True)
+            recorder.watch(game)
+            game.initialize()
+            while not game.end_date and game.turn <= 20:
+                play_first_playable_card(game, game.positions[game.current_position])
+                game.advance_to_next_decision()
+        recorder.close()
+    return operations, run
+
+CASES = (
+    ("game_initialize", game_initialize),
+    ("move_to_next_step", move_to_next_step),
+    ("bus_publish_fanout", bus_publish_fanout),
+    ("cost_is_satisfied_by", cost_is_satisfied_by),
+    ("validate_deck", validate_deck),
+    ("games_per_second", games_per_second),
+    ("recorded_games_per_second", recorded_games_per_second),
+)
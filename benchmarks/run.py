@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+# Copyright Bernardo Heynemann <heynemann@gmail.com>
+
+# Licensed under the Open Software License ("OSL") v. 3.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.opensource.org/licenses/osl-3.0.php
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import gc
+import sys
+import json
+import optparse
+from timeit import default_timer
+
+from benchmarks.cases import CASES
+
+def measure(case, scale=1, repeat=5):
+    # Best of repeat runs, each on freshly built state, with the collector off
+    # so its pauses don't land on whichever run happens to trigger them.
+    best = None
+    for attempt in range(repeat):
+        operations, run = case(scale)
+        gc.collect()
+        gc.disable()
+        try:
+            started = default_timer()
+            run()
+            elapsed = default_timer() - started
+        finally:
+            gc.enable()
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return {
+        "operations": operations,
+        "seconds": round(best, 6),
+        "ops_per_second": round(operations / max(best, 1e-9), 1),
+    }
+
+def run_benchmarks(names=None, scale=1, repeat=5):
+    results = {}
+    for name, case in CASES:
+        if names and name not in names:
+            continue
+        results[name] = measure(case, scale, repeat)
+    return results
+
+def compare(results, baseline, tolerance=0.2):
+    # Returns (name, baseline ops/s, current ops/s, regressed) for every
+    # benchmark in both runs; slower than baseline by more than tolerance
+    # (a fraction) is a regression.
+    comparison = []
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        expected = baseline[name]["ops_per_second"]
+        current = results[name]["ops_per_second"]
+        comparison.append((name, expected, current, current < expected * (1 - tolerance)))
+    return comparison
+
+def main(arguments=None):
+    parser = optparse.OptionParser(usage="python -m benchmarks.run [options] [benchmark ...]")
+    parser.add_option("--scale", type="int", default=1, help="multiplies the work done by every benchmark")
+    parser.add_option("--repeat", type="int", default=5, help="runs per benchmark; the best one is reported")
+    parser.add_option("--save", metavar="FILE", help="writes the results to FILE to be used as a baseline")
+    parser.add_option("--compare", metavar="FILE", help="flags benchmarks slower than the baseline in FILE")
+    parser.add_option("--tolerance", type="float", default=0.2, help="allowed slowdown against the baseline (default 0.2)")
+    options, names = parser.parse_args(arguments)
+
+    known = [name for name, case in CASES]
+    for name in names:
+        if name not in known:
+            parser.error("unknown benchmark %s, expected one of %s" % (name, ", ".join(known)))
+
+    results = run_benchmarks(names, options.scale, options.repeat)
+    print json.dumps(results, indent=2, sort_keys=True, separators=(",", ": "))
+
+    if options.save:
+        with open(options.save, "w") as stream:
+            json.dump(results, stream, indent=2, sort_keys=True, separators=(",", ": "))
+
+    if options.compare:
+        with open(options.compare) as stream:
+            baseline = json.load(stream)
+        regressions = 0
+        for name, expected, current, regressed in compare(results, baseline, options.tolerance):
+            # The table goes to stderr so stdout stays valid JSON.
+            print >> sys.stderr, "%-24s %14.1f %14.1f %+7.1f%%%s" % (name, expected, current,
+                                                                    (current / expected - 1) * 100,
+                                                                    regressed and "  REGRESSION" or "")
+            regressions += regressed
+        return regressions and 1 or 0
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -19,5 +19,7 @@ from libmagic.models import *
 from libmagic.game_modes import *
 from libmagic.phases import *
 from libmagic.bus import *
+from libmagic.zones import *
+from libmagic.metrics import MetricsRegistry
 from libmagic.errors import *
-
+from libmagic.simulation import simulate, run_game, GameResult
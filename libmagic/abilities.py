@@ -17,7 +17,14 @@
 
 from libmagic.errors import *
 
+class AbilityType(type):
+    def __init__(cls, name, bases, attrs):
+        super(AbilityType, cls).__init__(name, bases, attrs)
+        cls.ability_name = name.replace("Ability", "")
+
 class Ability(object):
+    __metaclass__ = AbilityType
+
     def __init__(self, card):
         self.card = card
         self.game = None
@@ -27,14 +34,23 @@ class Ability(object):
         self.game = game
         self.position = position
 
+    def mana_colors(self):
+        # Colors this ability can add to the pool right now, if it is a mana ability.
+        return ()
+
 class GenerateManaAndTapAbility(Ability):
 
+    def mana_colors(self):
+        if self.card.is_tapped:
+            return ()
+        return (self.card.color,)
+
     def execute(self):
         if not self.game or not self.card in self.position.battlefield:
-            raise InvalidOperationError(r"The player can only generate mana for cards in his battlefield.")
+            raise InvalidOperationError(r"The player can only generate mana for cards in his battlefield.", reason="not_on_battlefield")
         if self.card.is_tapped:
-            raise InvalidOperationError(r"The player can't generate mana out of a tapped card.")
+            raise InvalidOperationError(r"The player can't generate mana out of a tapped card.", reason="already_tapped")
 
-        self.position.mana[self.card.color] += 1
-        self.card.is_tapped = True
+        self.position.add_mana(self.card.color_index)
+        self.card.tap()
         self.game.bus.publish('mana_generated', self.game, self.position, self.card)
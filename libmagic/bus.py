@@ -15,10 +15,123 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import json
+from bisect import bisect_left
+from timeit import default_timer
+
+def _subscriber_name(func):
+    owner = getattr(func, 'im_self', None)
+    if owner is not None:
+        return "%s.%s.%s" % (owner.__class__.__module__, owner.__class__.__name__, func.__name__)
+    return "%s.%s" % (getattr(func, '__module__', None), getattr(func, '__name__', repr(func)))
+
+# Upper bounds, in seconds, of the buckets call times are counted in. They
+# are a quarter octave apart from 0.1 microseconds up, so a percentile read
+# off them is within about 19% of the exact one.
+_BOUNDS = tuple([1e-7 * 2 ** (step / 4.0) for step in range(120)])
+
+class Timing(object):
+    # Running figures for the calls to a message or a subscriber. Call times
+    # are counted in fixed buckets instead of kept, so an instrumented bus
+    # uses the same memory however long it runs.
+    __slots__ = ('calls', 'total', 'max', 'counts')
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.counts = [0] * (len(_BOUNDS) + 1)
+
+    def add(self, seconds):
+        self.calls += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.counts[bisect_left(_BOUNDS, seconds)] += 1
+
+    def merge(self, other):
+        self.calls += other.calls
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        self.counts = [count + other_count for count, other_count in zip(self.counts, other.counts)]
+
+    def percentile(self, fraction):
+        rank = max(1, int(round(fraction * self.calls)))
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                break
+        if bucket == len(_BOUNDS):
+            return self.max
+        return min(_BOUNDS[bucket], self.max)
+
+    def summary(self):
+        return {
+            "calls": self.calls,
+            "total": self.total,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "max": self.max,
+        }
+
 class Bus(object):
 
     def __init__(self):
         self.subscribers = {}
+        self.message_timings = {}
+        self.subscriber_timings = {}
+
+    def instrument(self):
+        # Swaps in a timed publish on this bus only, so the plain publish
+        # below stays as it is when instrumentation is off.
+        self.message_timings = {}
+        self.subscriber_timings = {}
+        self.publish = self.__publish_instrumented
+
+    def stop_instrumenting(self):
+        self.__dict__.pop('publish', None)
+
+    @property
+    def is_instrumented(self):
+        return 'publish' in self.__dict__
+
+    def __publish_instrumented(self, message, *args, **kw):
+        started = default_timer()
+        timings = self.subscriber_timings.setdefault(message, {})
+        for func in self.subscribers.get(message, ()):
+            func_started = default_timer()
+            func(*args, **kw)
+            elapsed = default_timer() - func_started
+            if func not in timings:
+                timings[func] = Timing()
+            timings[func].add(elapsed)
+        elapsed = default_timer() - started
+        if message not in self.message_timings:
+            self.message_timings[message] = Timing()
+        self.message_timings[message].add(elapsed)
+
+    def stats(self):
+        # Per message: publish count and wall time, in seconds, plus the same
+        # figures for each subscriber under "subscribers".
+        stats = {}
+        for message, timing in self.message_timings.iteritems():
+            by_name = {}
+            for func, func_timing in self.subscriber_timings.get(message, {}).iteritems():
+                by_name.setdefault(_subscriber_name(func), Timing()).merge(func_timing)
+
+            stats[message] = timing.summary()
+            stats[message]["subscribers"] = dict([(name, func_timing.summary())
+                                                  for name, func_timing in by_name.iteritems()])
+        return stats
+
+    def dump_stats(self, stream):
+        json.dump(self.stats(), stream, indent=2, sort_keys=True)
+
+    @staticmethod
+    def topic(message, qualifier):
+        return "%s:%s" % (message, qualifier)
 
     def subscribe(self, message, func):
         if message not in self.subscribers:
@@ -26,6 +139,15 @@ class Bus(object):
 
         self.subscribers[message].append(func)
 
+    def unsubscribe(self, message, func):
+        subscribers = self.subscribers.get(message)
+        if not subscribers or func not in subscribers:
+            return
+
+        subscribers.remove(func)
+        if not subscribers:
+            del self.subscribers[message]
+
     def publish(self, message, *args, **kw):
         if message not in self.subscribers:
             return
@@ -19,4 +19,10 @@ class GameNotInitializedError(RuntimeError):
     pass
 
 class InvalidOperationError(RuntimeError):
+    # reason is a short machine readable code for the message, if any.
+    def __init__(self, *args, **kw):
+        super(InvalidOperationError, self).__init__(*args)
+        self.reason = kw.get('reason')
+
+class ReplayError(RuntimeError):
     pass
@@ -24,7 +24,27 @@ class GameMode(object):
         return self.hit_points[player_name]
 
     def set_hit_points_for(self, player_name, hit_points):
+        self.game.record(self.hit_points.__setitem__, player_name, self.hit_points.get(player_name))
+        if player_name in self.hit_points:
+            self.game.toggle_hash('hit_points', player_name, self.hit_points[player_name])
+        self.game.toggle_hash('hit_points', player_name, hit_points)
         self.game.game_mode.hit_points[player_name] = hit_points
+        if "hit_points_changed" in self.game.bus.subscribers:
+            for position in self.game.positions:
+                if position.player.name == player_name:
+                    self.game.bus.publish("hit_points_changed", game=self.game, position=position, hit_points=hit_points)
+        if hit_points <= 0:
+            self.check_for_winner()
+
+    def check_for_winner(self):
+        if self.game.end_date:
+            return
+
+        alive = [position.player for position in self.game.positions if self.hit_points[position.player.name] > 0]
+        if len(alive) == 1:
+            self.game.finish(winner=alive[0])
+        elif not alive:
+            self.game.finish(winner=None)
 
     def validate_deck(self, deck):
         card_count = {}
@@ -63,15 +83,16 @@ class FreeForAll(GameMode):
             greatest_cost = 0
 
             for player_index, position in enumerate(self.game.positions):
-                if position.library.cards[index].cost.absolute > greatest_cost:
+                cost = position.library.peek(index).cost.absolute
+                if cost > greatest_cost:
                     greatest_cost_card_player_index = player_index
-                    greatest_cost = position.library.cards[index].cost.absolute
+                    greatest_cost = cost
 
             if greatest_cost_card_player_index > 0:
                 return greatest_cost_card_player_index
 
             index -= 1
             for player_index, position in enumerate(self.game.positions):
-                if abs(index) > len(position.library.cards):
+                if abs(index) > len(position.library):
                     return 0
 
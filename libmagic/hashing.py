@@ -0,0 +1,28 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+# Copyright Bernardo Heynemann <heynemann@gmail.com>
+
+# Licensed under the Open Software License ("OSL") v. 3.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.opensource.org/licenses/osl-3.0.php
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+
+# Zobrist keys are derived from a digest of the state component instead of
+# a random table, so every process agrees on them without sharing anything.
+_keys = {}
+
+def zobrist_key(*parts):
+    key = _keys.get(parts)
+    if key is None:
+        key = _keys[parts] = int(hashlib.md5(repr(parts)).hexdigest()[:16], 16)
+    return key
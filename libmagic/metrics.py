@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+# Copyright Bernardo Heynemann <heynemann@gmail.com>
+
+# Licensed under the Open Software License ("OSL") v. 3.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.opensource.org/licenses/osl-3.0.php
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from bisect import bisect_left
+
+# Reasons InvalidOperationError carries for rejected plays; each one gets a
+# preallocated slot, anything else is counted as "other".
+PLAY_REJECTION_REASONS = ("not_your_turn", "not_in_hand", "invalid_play", "cost_not_satisfied", "other")
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+class Counter(object):
+    __slots__ = ('name', 'help', 'label', 'labels', 'slots', 'values')
+
+    def __init__(self, name, help, label=None, labels=()):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.labels = tuple(labels)
+        self.slots = dict([(value, slot) for slot, value in enumerate(self.labels)])
+        self.values = [0] * max(1, len(self.labels))
+
+    def inc(self, amount=1, slot=0):
+        self.values[slot] += amount
+
+    def value(self, label=None):
+        if label is None:
+            return self.values[0]
+        return self.values[self.slots[label]]
+
+    def render(self):
+        lines = ["# HELP %s %s" % (self.name, self.help), "# TYPE %s counter" % self.name]
+        if not self.labels:
+            lines.append("%s %s" % (self.name, self.values[0]))
+        for label_value, value in zip(self.labels, self.values):
+            lines.append('%s{%s="%s"} %s' % (self.name, self.label, _escape(label_value), value))
+        return lines
+
+class Histogram(object):
+    __slots__ = ('name', 'help', 'buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, name, help, buckets):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self):
+        lines = ["# HELP %s %s" % (self.name, self.help), "# TYPE %s histogram" % self.name]
+        cumulative = 0
+        for bucket, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append('%s_bucket{le="%s"} %s' % (self.name, bucket, cumulative))
+        lines.append('%s_bucket{le="+Inf"} %s' % (self.name, self.count))
+        lines.append("%s_sum %s" % (self.name, self.sum))
+        lines.append("%s_count %s" % (self.name, self.count))
+        return lines
+
+class MetricsRegistry(object):
+    # Game level counters, fed by bus events of the games it watches. A game
+    # that isn't watched has no extra subscribers, so it pays nothing.
+
+    def __init__(self):
+        self.games_started = Counter("libmagic_games_started_total", "Games initialized.")
+        self.games_finished = Counter("libmagic_games_finished_total", "Games finished.")
+        self.turns = Histogram("libmagic_game_turns", "Turns played by finished games.",
+                               buckets=(1, 2, 5, 10, 15, 20, 30, 50, 100))
+        self.steps = Counter("libmagic_steps_total", "Steps started.")
+        self.plays = Counter("libmagic_plays_total", "Cards played.")
+        self.mana_taps = Counter("libmagic_mana_taps_total", "Cards tapped for mana.")
+        self.rejected_plays = Counter("libmagic_rejected_plays_total", "Plays rejected, by reason.",
+                                      label="reason", labels=PLAY_REJECTION_REASONS)
+        self.metrics = (self.games_started, self.games_finished, self.turns, self.steps,
+                        self.plays, self.mana_taps, self.rejected_plays)
+        self.subscriptions = (("game_started", self.on_game_started),
+                              ("game_finished", self.on_game_finished),
+                              ("step_started", self.on_step_started),
+                              ("card_played", self.on_card_played),
+                              ("mana_generated", self.on_mana_generated),
+                              ("play_rejected", self.on_play_rejected))
+
+    def watch(self, game):
+        # Call before game.initialize() so the start of the game is counted.
+        for message, func in self.subscriptions:
+            game.bus.subscribe(message, func)
+
+    def unwatch(self, game):
+        for message, func in self.subscriptions:
+            game.bus.unsubscribe(message, func)
+
+    def on_game_started(self, game):
+        self.games_started.inc()
+
+    def on_game_finished(self, game, winner):
+        self.games_finished.inc()
+        self.turns.observe(game.turn)
+
+    def on_step_started(self, game, phase, step):
+        self.steps.inc()
+
+    def on_card_played(self, game, position, card):
+        self.plays.inc()
+
+    def on_mana_generated(self, game, position, card):
+        self.mana_taps.inc()
+
+    def on_play_rejected(self, game, position, card, error):
+        slots = self.rejected_plays.slots
+        self.rejected_plays.inc(slot=slots.get(getattr(error, 'reason', None), slots["other"]))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
@@ -15,8 +15,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import copy
 import random
+from copy import deepcopy
+from datetime import datetime
 
 from formencode.validators import NotEmpty, ConfirmType, Int, Set
 
@@ -25,57 +26,300 @@ from libmagic.phases import *
 from libmagic.bus import *
 from libmagic.abilities import *
 from libmagic.errors import *
+from libmagic.hashing import zobrist_key
+from libmagic.zones import Zone
+
+ZONES = ("library", "hand", "battlefield", "graveyard")
+MANA_COLORS = ("green", "red", "black", "white", "blue", "colorless")
+MANA_INDEXES = dict([(color, slot) for slot, color in enumerate(MANA_COLORS)])
 
 class GameEventHandler(object):
     def __init__(self, game):
         self.game = game
 
     def perform_game_upkeep(self, game, phase, step):
-        if step.name != 'upkeep':
-            return
         position = self.game.positions[self.game.current_position]
+        position.reset_turn_state()
         for card in position.battlefield:
             card.on_upkeep(self.game, position)
 
     def perform_game_cleanup(self, game, phase, step):
-        if step.name != 'cleanup':
-            return
         self.game.positions[self.game.current_position].clear_mana()
 
+    def refresh_castable_cards(self, game, phase, step):
+        self.game.positions[self.game.current_position].refresh_castable()
+
+    def refresh_castable_after_mana(self, game, position, card):
+        position.refresh_castable([card for card in position.hand if card not in position.castable])
+
+    def refresh_castable_after_play(self, game, position, card):
+        position.refresh_castable()
+
 class Game(object):
     class Position(object):
         def __init__(self, index, game, player):
             self.index = index
             self.game = game
             self.player = player
-            self.library = copy.deepcopy(player.deck)
-            self.library.shuffle()
-            self.graveyard = []
-            self.hand = self.library.draw(7)
-            self.battlefield = []
-            self.clear_mana()
+            self.library = player.deck.instantiate(game, self)
+            self.library.shuffle(game.random)
+            self.graveyard = Zone()
+            self.hand = Zone()
+            self.battlefield = Zone()
+            self.castable = set()
+            self.mana = ManaPool(position=self)
+            self.turn_state = TurnState()
+            self.draw(7)
+
+        def zone(self, name):
+            if name == "library":
+                return self.library.cards
+            return getattr(self, name)
+
+        def draw(self, number_of_cards):
+            cards = self.library.draw(number_of_cards)
+            if cards:
+                self.game.record(self.__undraw, cards)
+            self.hand.extend(cards)
+            for card in cards:
+                card.change_zone("hand")
+            self.refresh_castable(cards)
+            if cards:
+                self.game.bus.publish('cards_drawn', self.game, self, cards)
+            return cards
+
+        def __undraw(self, cards):
+            for card in cards:
+                self.hand.remove(card)
+            self.library.put_back(cards)
+            for card in cards:
+                card.change_zone("library")
+
+        def move_card(self, card, zone, publish=True):
+            # Publishes card_moved unless the move is part of something
+            # published on its own, like playing the card.
+            source = self.zone(card.zone)
+            if self.game.journal is not None:
+                self.game.record(self.__put_back, card, card.zone, source.index(card))
+
+            source.remove(card)
+            self.zone(zone).append(card)
+            card.change_zone(zone)
+            self.castable.discard(card)
+            if zone == "hand":
+                self.refresh_castable([card])
+            if publish:
+                self.game.bus.publish('card_moved', self.game, self, card, zone)
+
+        def __put_back(self, card, zone, index):
+            self.zone(card.zone).remove(card)
+            self.zone(zone).insert(index, card)
+            card.change_zone(zone)
+
+        def add_mana(self, color, amount=1):
+            # color is a MANA_COLORS name or its slot in the pool.
+            if not isinstance(color, int):
+                color = MANA_INDEXES[color]
+            amounts = self.mana.amounts
+            current = amounts[color]
+            self.game.record(amounts.__setitem__, color, current)
+            self.game.toggle_hash('mana', self.index, color, current)
+            self.game.toggle_hash('mana', self.index, color, current + amount)
+            amounts[color] = current + amount
+
+        def pay_mana(self, cost):
+            before = tuple(self.mana.amounts)
+            self.mana.pay(cost)
+            self.game.record(self.mana.set_amounts, before)
+            self.__toggle_mana_hash(before)
+            self.refresh_castable()
+
+        def set_turn_state(self, name, value):
+            turn_state = self.turn_state
+            previous = getattr(turn_state, name)
+            if previous == value:
+                return
+            self.game.record(setattr, turn_state, name, previous)
+            self.__toggle_turn_state_hash(name, previous)
+            self.__toggle_turn_state_hash(name, value)
+            setattr(turn_state, name, value)
+
+        def reset_turn_state(self):
+            if self.turn_state.values() == TurnState.initial:
+                return
+            for name, value in zip(TurnState.__slots__, TurnState.initial):
+                self.set_turn_state(name, value)
+
+        def __toggle_turn_state_hash(self, name, value):
+            # Values at their start of turn default don't change the hash.
+            if value:
+                self.game.toggle_hash('turn_state', self.index, name, value)
+
+        def refresh_castable(self, cards=None):
+            if cards is None:
+                cards = self.hand
+                self.castable.clear()
+
+            satisfied = Cost.are_satisfied_by_pool([card.cost for card in cards], self.mana_pool())
+            for card, is_satisfied in zip(cards, satisfied):
+                if is_satisfied and card.validate_play(self.game, self)[0]:
+                    self.castable.add(card)
+                else:
+                    self.castable.discard(card)
+
+        def plan_payment(self, cost):
+            # Picks the untapped mana sources to tap so that, together with the
+            # floating mana, the pool pays cost. Returns None when it can't be paid.
+            # Sources are grouped by the bitmask of colors they can make and a DP
+            # over the groups chooses how many of each group pay each color,
+            # tapping the least flexible and least demanded sources first.
+            pool = self.mana_pool()
+            needs = [max(0, required - available) for required, available in zip(cost.amounts[:5], pool[:5])]
+            leftover = sum(pool) - sum([min(required, available) for required, available in zip(cost.amounts[:5], pool[:5])])
+            needs.append(max(0, cost.colorless - leftover))
+            if not any(needs):
+                return []
+
+            groups = {}
+            for card in self.battlefield.select(tapped=False):
+                for ability in card.abilities:
+                    mask = 0
+                    for color in ability.mana_colors():
+                        if color in MANA_COLORS:
+                            mask |= 1 << MANA_COLORS.index(color)
+                    if mask:
+                        groups.setdefault(mask, []).append(card)
+                        break
+
+            demand = [0] * len(MANA_COLORS)
+            for card in self.hand:
+                for slot, amount in enumerate(card.cost.amounts[:5]):
+                    demand[slot] += amount
+
+            masks = sorted(groups)
+            states = {tuple(needs): (0, ())}
+            for mask in masks:
+                slots = [slot for slot in range(5) if mask & (1 << slot)] + [5]
+                weight = len(slots) * 1000 + sum([demand[slot] for slot in slots])
+                next_states = {}
+                for remaining, (penalty, picks) in states.iteritems():
+                    for allocation in self.__allocations(slots, len(groups[mask]), remaining):
+                        used = sum(allocation)
+                        remaining_after = list(remaining)
+                        for slot, amount in zip(slots, allocation):
+                            remaining_after[slot] -= amount
+                        remaining_after = tuple(remaining_after)
+                        candidate = (penalty + used * weight, picks + (used,))
+                        if remaining_after not in next_states or candidate < next_states[remaining_after]:
+                            next_states[remaining_after] = candidate
+                states = next_states
+
+            best = states.get((0,) * len(MANA_COLORS))
+            if best is None:
+                return None
+
+            chosen = set()
+            for mask, used in zip(masks, best[1]):
+                chosen.update(groups[mask][:used])
+            return [card for card in self.battlefield if card in chosen]
+
+        @staticmethod
+        def __allocations(slots, available, remaining):
+            # Every way to spend up to available identical sources over slots.
+            if not slots:
+                yield ()
+                return
+            slot = slots[0]
+            for amount in range(min(available, remaining[slot]) + 1):
+                for rest in Game.Position.__allocations(slots[1:], available - amount, remaining):
+                    yield (amount,) + rest
+
+        def mana_pool(self):
+            return tuple(self.mana.amounts)
 
         def clear_mana(self):
-            self.mana = {
-                "green":0,
-                "red":0,
-                "black":0,
-                "white":0,
-                "blue":0,
-                "colorless":0,
-            }
+            if not any(self.mana.amounts):
+                return
+            before = tuple(self.mana.amounts)
+            self.game.record(self.mana.set_amounts, before)
+            self.mana.reset()
+            self.__toggle_mana_hash(before)
+
+        def __toggle_mana_hash(self, before):
+            for color, (previous, current) in enumerate(zip(before, self.mana.amounts)):
+                if previous != current:
+                    self.game.toggle_hash('mana', self.index, color, previous)
+                    self.game.toggle_hash('mana', self.index, color, current)
 
         @property
         def hit_points(self):
             return self.game.game_mode.get_hit_points_for(self.player.name)
 
-    def __init__(self, game_mode=None, phases=default_phases):
+        def compute_hash(self):
+            value = 0
+            for zone in ZONES:
+                if zone == "library":
+                    cards = self.library.remaining()
+                else:
+                    cards = self.zone(zone)
+                for card in cards:
+                    value ^= zobrist_key('card', self.index, card.index, zone)
+                    if card.is_tapped:
+                        value ^= zobrist_key('tapped', self.index, card.index)
+            for color, amount in enumerate(self.mana.amounts):
+                value ^= zobrist_key('mana', self.index, color, amount)
+            for name, state in zip(TurnState.__slots__, self.turn_state.values()):
+                if state:
+                    value ^= zobrist_key('turn_state', self.index, name, state)
+            return value
+
+        def snapshot(self):
+            return (tuple(self.library.cards),
+                    tuple(self.hand),
+                    tuple(self.battlefield),
+                    tuple(self.graveyard),
+                    tuple([card.is_tapped for card in self.battlefield]),
+                    tuple(self.mana.amounts),
+                    self.turn_state.values())
+
+        def restore(self, state):
+            library, hand, battlefield, graveyard, tapped, mana, turn_state = state
+
+            for card in self.battlefield:
+                card.set_tapped(False)
+            for zone, cards in zip(ZONES, (library, hand, battlefield, graveyard)):
+                for card in cards:
+                    if card.zone != zone:
+                        card.change_zone(zone)
+                self.zone(zone)[:] = cards
+            for card, is_tapped in zip(battlefield, tapped):
+                card.set_tapped(is_tapped)
+
+            self.mana.set_amounts(mana)
+            self.turn_state.set_values(turn_state)
+
+    class Snapshot(object):
+        __slots__ = ('turn', 'current_position', 'step_index',
+                     'positions', 'hit_points', 'winner', 'end_date', 'hash')
+
+        def __init__(self, game):
+            self.turn = game.turn
+            self.current_position = game.current_position
+            self.step_index = game.step_index
+            self.positions = tuple([position.snapshot() for position in game.positions])
+            self.hit_points = dict(game.game_mode.hit_points)
+            self.winner = game.winner
+            self.end_date = game.end_date
+            self.hash = game.hash
+
+    def __init__(self, game_mode=None, phases=default_phases, seed=None, journal=False):
         self.event_handler = GameEventHandler(self)
         if not game_mode:
             game_mode = FreeForAll()
 
         self.start_date = None
         self.end_date = None
+        self.winner = None
         self.players = []
 
         game_mode_is_required = 'The game mode must be a GameMode subclass and is required.'
@@ -86,7 +330,22 @@ class Game(object):
         self.turn = 0
         self.phases = phases
         self.bus = Bus()
-
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.journaling = journal
+        self.journal = None
+        self.hash = 0
+
+        # Turn structure compiled to a flat list of (phase, step, automatic,
+        # starts_phase, phase_topic, step_topic), walked with step_index.
+        self.transitions = []
+        for phase in phases:
+            for step_number, step in enumerate(phase.steps):
+                self.transitions.append((phase, step, step.automatic, step_number == 0,
+                                         Bus.topic("phase_started", phase.name),
+                                         Bus.topic("step_started", step.name)))
+
+        self.step_index = None
         self.current_phase = None
         self.current_step = None
         self.current_position = None
@@ -107,59 +366,184 @@ class Game(object):
             player.position = position
             player.game = self
             self.positions.append(position)
-            for card in position.library.cards:
-                card.initialize(self, position)
-                for ability in card.abilities:
-                    ability.initialize(self, position)
 
         self.game_mode.initialize(self)
-        self.bus.subscribe('step_started', self.event_handler.perform_game_cleanup)
-        self.bus.subscribe('step_started', self.event_handler.perform_game_upkeep)
+        self.bus.subscribe(Bus.topic('step_started', 'cleanup'), self.event_handler.perform_game_cleanup)
+        self.bus.subscribe(Bus.topic('step_started', 'upkeep'), self.event_handler.perform_game_upkeep)
+        self.bus.subscribe(Bus.topic('step_started', 'cleanup'), self.event_handler.refresh_castable_cards)
+        self.bus.subscribe(Bus.topic('step_started', 'upkeep'), self.event_handler.refresh_castable_cards)
+        self.bus.subscribe('mana_generated', self.event_handler.refresh_castable_after_mana)
+        self.bus.subscribe('card_played', self.event_handler.refresh_castable_after_play)
         self.turn = 1
+        self.start_date = datetime.now()
 
         self.advance_auto_phases()
 
+        for position in self.positions:
+            position.refresh_castable()
+        self.hash = self.compute_hash()
+        if self.journaling:
+            self.journal = []
+        self.bus.publish("game_started", game=self)
+
+    def toggle_hash(self, *parts):
+        self.hash ^= zobrist_key(*parts)
+
+    def compute_hash(self):
+        value = zobrist_key('position', self.current_position) ^ \
+                zobrist_key('step', self.step_index)
+        for player_name, hit_points in self.game_mode.hit_points.iteritems():
+            value ^= zobrist_key('hit_points', player_name, hit_points)
+        for position in self.positions:
+            value ^= position.compute_hash()
+        return value
+
+    def record(self, undo, *args):
+        if self.journal is not None:
+            self.journal.append((undo, args))
+
+    def checkpoint(self):
+        if self.journal is None:
+            raise InvalidOperationError("The game must be created with journal=True and initialized before taking checkpoints.")
+        return (len(self.journal), self.hash)
+
+    def rollback(self, checkpoint):
+        if self.journal is None:
+            raise InvalidOperationError("The game must be created with journal=True and initialized before rolling back.")
+
+        length, state_hash = checkpoint
+        journal, self.journal = self.journal, None
+        try:
+            while len(journal) > length:
+                undo, args = journal.pop()
+                undo(*args)
+        finally:
+            self.journal = journal
+        self.hash = state_hash
+        for position in self.positions:
+            position.refresh_castable()
+        self.bus.publish("rolled_back", game=self, checkpoint=checkpoint)
+
+    def snapshot(self):
+        return Game.Snapshot(self)
+
+    def restore(self, snapshot):
+        # Journaled as a single step, undone by restoring the state before it,
+        # so checkpoints taken earlier can still be rolled back to.
+        if self.journal is not None:
+            self.record(self.restore, self.snapshot())
+        for position, state in zip(self.positions, snapshot.positions):
+            position.restore(state)
+
+        self.game_mode.hit_points.clear()
+        self.game_mode.hit_points.update(snapshot.hit_points)
+        self.__restore_step(snapshot.turn, snapshot.current_position, snapshot.step_index)
+        self.winner = snapshot.winner
+        self.end_date = snapshot.end_date
+        self.hash = snapshot.hash
+        for position in self.positions:
+            position.refresh_castable()
+
+    def finish(self, winner=None):
+        if self.end_date:
+            raise InvalidOperationError("The game has already finished.")
+
+        self.record(setattr, self, 'winner', self.winner)
+        self.record(setattr, self, 'end_date', self.end_date)
+        self.winner = winner
+        self.end_date = datetime.now()
+        self.bus.publish("game_finished", game=self, winner=winner)
+
     def advance_auto_phases(self):
-        for phase in self.phases:
-            self.current_phase = phase
+        self.__set_step(0)
+        self.__publish_phase_started()
+        self.__publish_step_started()
+        if self.current_step.automatic:
+            self.move_to_next_step()
+
+    def __publish_phase_started(self):
+        phase, phase_topic = self.current_phase, self.transitions[self.step_index][4]
+        subscribers = self.bus.subscribers
+        if "phase_started" in subscribers:
             self.bus.publish("phase_started", game=self, phase=phase)
-            for step in phase.steps:
-                self.current_step = step
-                self.bus.publish("step_started", game=self, phase=phase, step=step)
-                if not step.automatic:
-                    return
+        if phase_topic in subscribers:
+            self.bus.publish(phase_topic, game=self, phase=phase)
+
+    def __publish_step_started(self):
+        phase, step, step_topic = self.current_phase, self.current_step, self.transitions[self.step_index][5]
+        subscribers = self.bus.subscribers
+        if "step_started" in subscribers:
+            self.bus.publish("step_started", game=self, phase=phase, step=step)
+        if step_topic in subscribers:
+            self.bus.publish(step_topic, game=self, phase=phase, step=step)
 
     def __move_to_next_position(self):
+        self.toggle_hash('position', self.current_position)
         if self.current_position >= len(self.positions) - 1:
             self.current_position = 0
             self.turn += 1
         else:
             self.current_position += 1
+        self.toggle_hash('position', self.current_position)
 
         self.bus.publish("position_changed", 
                           game=self, 
                           position_index=self.current_position, 
                           position=self.positions[self.current_position])
 
-    def __move_to_next_phase(self):
-        if self.phases.index(self.current_phase) >= len(self.phases) - 1:
-            self.__move_to_next_position()
-            self.current_phase = self.phases[0]
-        else:
-            self.current_phase = self.phases[self.phases.index(self.current_phase)+1]
+    def __set_step(self, step_index):
+        self.step_index = step_index
+        self.current_phase, self.current_step = self.transitions[step_index][:2]
 
-        self.bus.publish("phase_started", game=self, phase=self.current_phase)
+    def __restore_step(self, turn, current_position, step_index):
+        self.turn = turn
+        self.current_position = current_position
+        self.__set_step(step_index)
 
     def move_to_next_step(self):
-        if self.current_phase.steps.index(self.current_step) >= len(self.current_phase.steps) - 1:
-            self.__move_to_next_phase()
-            self.current_step = self.current_phase.steps[0]
-        else:
-            self.current_step = self.current_phase.steps[self.current_phase.steps.index(self.current_step) + 1]
-    
-        self.bus.publish("step_started", game=self, phase=self.current_phase, step=self.current_step)
-        if self.current_step.automatic:
-            self.move_to_next_step()
+        self.__advance(stop_at_decisions=False)
+
+    def advance_to_next_decision(self):
+        self.__advance(stop_at_decisions=True)
+
+    def is_decision_point(self, step_index):
+        phase, step, automatic, starts_phase, phase_topic, step_topic = self.transitions[step_index]
+        if automatic:
+            return False
+        if not step.optional:
+            return True
+        if step_topic in self.bus.subscribers or phase_topic in self.bus.subscribers:
+            return True
+
+        for position in self.positions:
+            for card in position.battlefield:
+                if card.acts_during(self, phase, step):
+                    return True
+        return False
+
+    def __advance(self, stop_at_decisions):
+        self.record(self.__restore_step, self.turn, self.current_position, self.step_index)
+
+        # A whole cycle of automatic steps stops where it started instead of
+        # looping forever.
+        for attempt in xrange(len(self.transitions)):
+            self.toggle_hash('step', self.step_index)
+            step_index = self.step_index + 1
+            if step_index == len(self.transitions):
+                step_index = 0
+                self.__move_to_next_position()
+            self.__set_step(step_index)
+            self.toggle_hash('step', step_index)
+
+            phase, step, automatic, starts_phase = self.transitions[step_index][:4]
+            if starts_phase:
+                self.__publish_phase_started()
+            self.__publish_step_started()
+            if stop_at_decisions:
+                if self.is_decision_point(step_index):
+                    return
+            elif not automatic:
+                return
 
 class Player(object):
     def __init__(self, name, deck):
@@ -176,27 +560,47 @@ class Player(object):
         self.position = None
         self.game = None
 
-    def play(self, card):
+    def play(self, card, auto_pay=False):
         if not self.game or not self.position:
             raise GameNotInitializedError("You must call game.initialize() before trying to play a card.")
 
+        try:
+            self.__check_play(card, auto_pay)
+        except InvalidOperationError, error:
+            self.game.bus.publish('play_rejected', self.game, self.position, card, error)
+            raise
+
+        self.position.move_card(card, "battlefield", publish=False)
+
+        card.on_play(self.game, self.position)
+        self.game.bus.publish('card_played', self.game, self.position, card)
+
+        # Paid once the card is played, so a replay can play it like any
+        # other card and then spend the mana on the mana_paid event.
+        if auto_pay:
+            self.position.pay_mana(card.cost)
+            self.game.bus.publish('mana_paid', self.game, self.position, card)
+
+    def __check_play(self, card, auto_pay):
         if self.game.current_position != self.position.index:
-            raise InvalidOperationError("It's not %s's turn to play." % self.name)
+            raise InvalidOperationError("It's not %s's turn to play." % self.name, reason="not_your_turn")
 
         if card not in self.position.hand:
-            raise InvalidOperationError("The card must be in the player's hand in order to be played.")
+            raise InvalidOperationError("The card must be in the player's hand in order to be played.", reason="not_in_hand")
 
         is_valid, message = card.validate_play(self.game, self.position)
         if not is_valid:
-            raise InvalidOperationError(message)
-
-        if not card.cost.is_satisfied_by(**self.position.mana):
-            raise InvalidOperationError("The card cost must be satisfied in order for it to be played.")
+            raise InvalidOperationError(message, reason="invalid_play")
 
-        self.position.hand.remove(card)
-        self.position.battlefield.append(card)
+        if auto_pay:
+            plan = self.position.plan_payment(card.cost)
+            if plan is None:
+                raise InvalidOperationError("The card cost must be satisfied in order for it to be played.", reason="cost_not_satisfied")
+            for source in plan:
+                source.GenerateManaAndTap()
 
-        card.on_play(self.game, self.position)
+        if not card.cost.is_satisfied_by_pool(self.position.mana_pool()):
+            raise InvalidOperationError("The card cost must be satisfied in order for it to be played.", reason="cost_not_satisfied")
 
 class Deck(object):
     def __init__(self, name, cards):
@@ -208,8 +612,11 @@ class Deck(object):
         ct = ConfirmType(type=(list, tuple), messages={'empty':cards_are_required, 'noneType':cards_are_required, 'inType':cards_are_required})
         self.cards = ct.to_python(cards)
 
-    def shuffle(self):
-        random.shuffle(self.cards)
+    def instantiate(self, game, position):
+        return Library(self.name, [card.instantiate(game, position, index) for index, card in enumerate(self.cards)])
+
+    def shuffle(self, random_generator=random):
+        random_generator.shuffle(self.cards)
 
     def draw(self, number_of_cards):
         cards = self.cards[:number_of_cards]
@@ -217,75 +624,397 @@ class Deck(object):
 
         return cards
 
+class Library(Deck):
+    # The cards of a deck in play. Cards are kept in an order list read from
+    # a cursor, so drawing is O(1). Shuffling is lazy: the list is split into
+    # a fixed top [cursor, top), an unshuffled pool [top, bottom) and a fixed
+    # bottom [bottom, end), and a Fisher-Yates step fixes each position only
+    # when it is first drawn or peeked at. The library has its own random
+    # stream and always fixes the top in the same order, so the cards drawn
+    # don't depend on when the whole order is looked at.
+
+    def __init__(self, name, cards):
+        super(Library, self).__init__(name, list(cards))
+
+    def get_cards(self):
+        self.__fix_top(len(self.order) - 1)
+        if self.cursor:
+            del self.order[:self.cursor]
+            self.cursor = 0
+        return self.order
+
+    def set_cards(self, cards):
+        self.order = cards
+        self.cursor = 0
+        self.top = self.bottom = 0
+        self.random = None
+
+    cards = property(get_cards, set_cards)
+
+    def shuffle(self, random_generator=random):
+        if self.cursor:
+            del self.order[:self.cursor]
+            self.cursor = 0
+        self.random = random.Random(random_generator.getrandbits(64))
+        self.top = 0
+        self.bottom = len(self.order)
+
+    def __fix_top(self, position):
+        while self.top <= position and self.top < self.bottom:
+            swap = self.random.randrange(self.top, self.bottom)
+            self.order[self.top], self.order[swap] = self.order[swap], self.order[self.top]
+            self.top += 1
+
+    def __fix_bottom(self, position):
+        while self.bottom > position and self.top < self.bottom:
+            swap = self.random.randrange(self.top, self.bottom)
+            self.bottom -= 1
+            self.order[self.bottom], self.order[swap] = self.order[swap], self.order[self.bottom]
+
+    def draw(self, number_of_cards):
+        end = min(self.cursor + number_of_cards, len(self.order))
+        self.__fix_top(end - 1)
+        cards = self.order[self.cursor:end]
+        self.cursor = end
+
+        return cards
+
+    def put_back(self, cards):
+        # Puts cards back on top, in order, reusing the slots they were drawn from.
+        if len(cards) <= self.cursor:
+            self.cursor -= len(cards)
+            self.order[self.cursor:self.cursor + len(cards)] = cards
+        else:
+            self.cards[:0] = cards
+
+    def peek(self, index):
+        # Returns the card at index from the top (or from the bottom when
+        # negative) without drawing it, fixing only that end of the order.
+        if index >= 0:
+            position = self.cursor + index
+            if position >= len(self.order):
+                raise IndexError("library index out of range")
+            self.__fix_top(position)
+        else:
+            position = len(self.order) + index
+            if position < self.cursor:
+                raise IndexError("library index out of range")
+            self.__fix_bottom(position)
+        return self.order[position]
+
+    def remaining(self):
+        # The cards still in the library, in storage rather than draw order.
+        return self.order[self.cursor:]
+
+    def __len__(self):
+        return len(self.order) - self.cursor
+
 class Cost(object):
     def __init__(self, **kw):
-        self.red = "red" in kw and kw["red"] or 0
-        self.black = "black" in kw and kw["black"] or 0
-        self.white = "white" in kw and kw["white"] or 0
-        self.blue = "blue" in kw and kw["blue"] or 0
-        self.green = "green" in kw and kw["green"] or 0
-        self.colorless = "colorless" in kw and kw["colorless"] or 0
+        # One slot per color, in MANA_COLORS order.
+        self.amounts = tuple([color in kw and kw[color] or 0 for color in MANA_COLORS])
 
     @classmethod
     def empty(cls):
         return Cost()
 
+    @property
+    def green(self):
+        return self.amounts[0]
+
+    @property
+    def red(self):
+        return self.amounts[1]
+
+    @property
+    def black(self):
+        return self.amounts[2]
+
+    @property
+    def white(self):
+        return self.amounts[3]
+
+    @property
+    def blue(self):
+        return self.amounts[4]
+
+    @property
+    def colorless(self):
+        return self.amounts[5]
+
     @property
     def absolute(self):
-        return self.red + self.black + self.white + self.blue + self.green + self.colorless
+        return sum(self.amounts)
 
     def is_satisfied_by(self, **kw):
-        payable_red = "red" in kw and kw["red"] or 0
-        payable_black = "black" in kw and kw["black"] or 0
-        payable_white = "white" in kw and kw["white"] or 0
-        payable_blue = "blue" in kw and kw["blue"] or 0
-        payable_green = "green" in kw and kw["green"] or 0
-        payable_colorless = "colorless" in kw and kw["colorless"] or 0
-
-        if payable_red < self.red:
-            return False
-        if payable_black < self.black:
-            return False
-        if payable_green < self.green:
-            return False
-        if payable_white < self.white:
-            return False
-        if payable_blue < self.blue:
+        return self.is_satisfied_by_pool([color in kw and kw[color] or 0 for color in MANA_COLORS])
+
+    def is_satisfied_by_pool(self, pool):
+        green, red, black, white, blue, colorless = self.amounts
+        payable_green, payable_red, payable_black, payable_white, payable_blue, payable_colorless = pool
+
+        if payable_red < red or payable_black < black or payable_green < green or \
+           payable_white < white or payable_blue < blue:
             return False
 
         #Mana Available now is all mana minus the colored ones already spent
-        mana_available = payable_red - self.red + \
-                         payable_green - self.green + \
-                         payable_white - self.white + \
-                         payable_black - self.black + \
-                         payable_blue - self.blue + \
+        mana_available = payable_red - red + \
+                         payable_green - green + \
+                         payable_white - white + \
+                         payable_black - black + \
+                         payable_blue - blue + \
                          payable_colorless
 
-        if mana_available < self.colorless:
-            return False
+        return mana_available >= colorless
+
+    @staticmethod
+    def are_satisfied_by_pool(costs, pool):
+        payable_green, payable_red, payable_black, payable_white, payable_blue, payable_colorless = pool
+        payable_total = sum(pool)
+
+        satisfied = []
+        for cost in costs:
+            green, red, black, white, blue, colorless = cost.amounts
+            satisfied.append(payable_red >= red and payable_black >= black and payable_green >= green and
+                             payable_white >= white and payable_blue >= blue and
+                             payable_total - green - red - black - white - blue >= colorless)
+        return satisfied
+
+class ManaPool(object):
+    # The mana a position has floating, one slot per color in MANA_COLORS
+    # order. It is reset in place; pool["green"] style reads still work, and
+    # pool["green"] = n writes go through the position that owns the pool,
+    # so the game journal, hash and castable cards follow them.
+    __slots__ = ('amounts', 'position')
+
+    def __init__(self, amounts=None, position=None):
+        self.amounts = [0] * len(MANA_COLORS)
+        self.position = position
+        if amounts is not None:
+            self.set_amounts(amounts)
+
+    def set_amounts(self, amounts):
+        self.amounts[:] = amounts
+
+    def reset(self):
+        self.amounts[:] = [0] * len(MANA_COLORS)
+
+    def add(self, color, amount=1):
+        self.amounts[color] += amount
+
+    def can_pay(self, cost):
+        return cost.is_satisfied_by_pool(self.amounts)
+
+    def pay(self, cost):
+        if not self.can_pay(cost):
+            raise InvalidOperationError("The mana pool can't pay this cost.", reason="cost_not_satisfied")
+
+        amounts = self.amounts
+        for color, amount in enumerate(cost.amounts[:5]):
+            amounts[color] -= amount
+
+        #Colorless costs take colorless mana first, then the most plentiful colors
+        colorless = cost.colorless
+        paid = min(colorless, amounts[5])
+        amounts[5] -= paid
+        colorless -= paid
+        while colorless:
+            color = max(range(5), key=amounts.__getitem__)
+            amounts[color] -= 1
+            colorless -= 1
+
+    def keys(self):
+        return list(MANA_COLORS)
+
+    def iteritems(self):
+        return iter(zip(MANA_COLORS, self.amounts))
+
+    def __iter__(self):
+        return iter(MANA_COLORS)
+
+    def __getitem__(self, color):
+        return self.amounts[MANA_INDEXES[color]]
+
+    def __setitem__(self, color, amount):
+        color = MANA_INDEXES[color]
+        if self.position is None:
+            self.amounts[color] = amount
+            return
+        current = self.amounts[color]
+        if amount != current:
+            self.position.add_mana(color, amount - current)
+            self.position.refresh_castable()
+
+    def __repr__(self):
+        return "ManaPool(%r)" % dict(self.iteritems())
+
+class TurnState(object):
+    # Rule state that only lasts for a turn, one per position so games never
+    # share it. Positions reset it on their upkeep; a new rule adds its slot
+    # here along with its start of turn value.
+    __slots__ = ('has_played_land',)
+    initial = (False,)
+
+    def __init__(self):
+        self.set_values(self.initial)
+
+    def values(self):
+        return tuple([getattr(self, name) for name in self.__slots__])
+
+    def set_values(self, values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    def __repr__(self):
+        return "TurnState(%r)" % dict(zip(self.__slots__, self.values()))
+
+class CardDefinition(object):
+    __slots__ = ('name', 'cost', 'color', 'color_index', 'ability_types')
 
-        return True
+    def __init__(self, name, cost, color=None, ability_types=()):
+        object.__setattr__(self, 'name', name)
+        object.__setattr__(self, 'cost', cost)
+        object.__setattr__(self, 'color', color)
+        object.__setattr__(self, 'color_index', MANA_INDEXES.get(color))
+        object.__setattr__(self, 'ability_types', tuple(ability_types))
+
+    def __setattr__(self, name, value):
+        raise InvalidOperationError("Card definitions are shared by every game and can't be changed.")
+
+    def __reduce__(self):
+        return (CardDefinition, (self.name, self.cost, self.color, self.ability_types))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+# The attributes every game sets up on its own card instances. Anything else
+# a subclass keeps on the prototype card is copied over by instantiate().
+GAME_CARD_ATTRIBUTES = frozenset(('definition', 'index', 'zone', 'game', 'position', '_is_tapped',
+                                  'abilities', 'ability_table'))
 
 class Card(object):
-    def __init__(self, name, cost):
+    def __init__(self, name, cost, color=None, ability_types=()):
         name_is_required = 'The card name must be a string and is required.'
         ne = NotEmpty(messages={'empty':name_is_required, 'noneType':name_is_required, 'badType':name_is_required})
-        self.name = ne.to_python(name)
+        name = ne.to_python(name)
 
         cost_is_required = "The card must have a cost of type Cost (even if it's zero mana)."
         ne = NotEmpty(messages={'empty':cost_is_required, 'noneType':cost_is_required, 'badType':cost_is_required})
         ct = ConfirmType(type=(Cost), messages={'empty':cost_is_required, 'noneType':cost_is_required, 'type':cost_is_required})
-        self.cost = ct.to_python(ne.to_python(cost))
+        cost = ct.to_python(ne.to_python(cost))
 
-        self.is_tapped = False
+        self.definition = CardDefinition(name, cost, color, ability_types)
+        self.index = None
+        self.zone = None
         self.game = None
         self.position = None
+        self._is_tapped = False
         self.abilities = []
+        self.ability_table = {}
+
+    @property
+    def name(self):
+        return self.definition.name
+
+    @property
+    def cost(self):
+        return self.definition.cost
+
+    @property
+    def color(self):
+        return self.definition.color
+
+    @property
+    def color_index(self):
+        return self.definition.color_index
+
+    @property
+    def ability_types(self):
+        return self.definition.ability_types
+
+    @property
+    def is_tapped(self):
+        return self._is_tapped
+
+    @is_tapped.setter
+    def is_tapped(self, is_tapped):
+        previous = self._is_tapped
+        if previous == is_tapped:
+            return
+        if self.game is not None:
+            self.game.record(self.set_tapped, previous)
+            self.game.toggle_hash('tapped', self.position.index, self.index)
+        self.set_tapped(is_tapped)
+
+    def set_tapped(self, is_tapped):
+        # Writes the tapped state without journaling it or updating the game
+        # hash, for putting back state the game already accounts for.
+        self._is_tapped = is_tapped
+        if self.position is not None and self.zone != "library":
+            self.position.zone(self.zone).update(self)
+
+    def instantiate(self, game, position, index=None):
+        card = self.__class__.__new__(self.__class__)
+        card.definition = self.definition
+        card.index = index
+        card.zone = "library"
+        card.game = game
+        card.position = position
+        card._is_tapped = False
+        card.abilities = []
+        card.ability_table = {}
+        fields = dict([(name, value) for name, value in self.__dict__.iteritems()
+                            if name not in GAME_CARD_ATTRIBUTES])
+        if fields:
+            card.__dict__.update(deepcopy(fields))
+        return card
 
     def initialize(self, game, position):
         self.game = game
         self.position = position
         self.abilities = []
+        self.ability_table = {}
+        for ability_type in self.ability_types:
+            ability = ability_type(self)
+            ability.initialize(game, position)
+            self.add_ability(ability)
+
+    def add_ability(self, ability):
+        self.abilities.append(ability)
+        self.ability_table.setdefault(ability.ability_name, ability.execute)
+
+    def change_zone(self, zone):
+        previous_zone, self.zone = self.zone, zone
+        self.game.toggle_hash('card', self.position.index, self.index, previous_zone)
+        self.game.toggle_hash('card', self.position.index, self.index, zone)
+
+        if previous_zone == "battlefield":
+            self.deactivate()
+        if zone == "library":
+            self.abilities = []
+            self.ability_table = {}
+        elif previous_zone == "library":
+            self.initialize(self.game, self.position)
+        if zone == "battlefield":
+            self.activate()
+
+    def activate(self):
+        pass
+
+    def deactivate(self):
+        pass
+
+    def tap(self):
+        self.is_tapped = True
+
+    def untap(self):
+        self.is_tapped = False
+
+    def acts_during(self, game, phase, step):
+        return False
 
     def validate_play(self, game, position):
         return (True, None)
@@ -297,44 +1026,25 @@ class Card(object):
         pass
 
     def __getattr__(self, name):
-        if name.startswith("__") or name == "abilities":
-            return object.__getattribute__(self, name)
-
-        for ability in self.abilities:
-            if ability.__class__.__name__.replace("Ability","") == name:
-                return ability.execute
-
-        raise AttributeError, name
+        try:
+            return self.__dict__['ability_table'][name]
+        except KeyError:
+            raise AttributeError, name
 
 class Land(Card):
-    has_played_land = {}
     def __init__(self, name, color):
-        super(Land, self).__init__(name, Cost.empty())
-        self.color = color
-
-    def initialize(self, game, position):
-        super(Land, self).initialize(game=game, position=position)
-        game.bus.subscribe('step_started', self.handle_upkeep_step)
-        self.abilities.append(GenerateManaAndTapAbility(self))
-
-    def handle_upkeep_step(self, game, phase, step):
-        if step.name != "upkeep": 
-            return
-
-        Land.has_played_land[game.current_position] = False
+        super(Land, self).__init__(name, Cost.empty(), color=color, ability_types=(GenerateManaAndTapAbility,))
 
     def validate_play(self, game, position):
         super(Land, self).validate_play(game, position)
 
-        has_played = position.index in Land.has_played_land and Land.has_played_land[position.index]
-
-        return (not has_played, "The player can only play one land per turn.")
+        return (not position.turn_state.has_played_land, "The player can only play one land per turn.")
 
     def on_upkeep(self, game, position):
         super(Land, self).on_play(game, position)
-        self.is_tapped = False
+        self.untap()
 
     def on_play(self, game, position):
         super(Land, self).on_play(game, position)
-        Land.has_played_land[position.index] = True
+        position.set_turn_state('has_played_land', True)
 
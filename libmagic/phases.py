@@ -21,9 +21,10 @@ class Phase(object):
         self.steps = steps
 
 class Step(object):
-    def __init__(self, name, automatic=False):
+    def __init__(self, name, automatic=False, optional=False):
         self.name = name
         self.automatic = automatic
+        self.optional = optional
 
 default_phases = [
                     Phase("beggining",
@@ -36,9 +37,9 @@ default_phases = [
                     Phase("combat",
                             [
                                 Step("beggining", automatic=True),
-                                Step("declare_attackers"),
-                                Step("declare_blockers"),
-                                Step("damage"),
+                                Step("declare_attackers", optional=True),
+                                Step("declare_blockers", optional=True),
+                                Step("damage", optional=True),
                                 Step("end", automatic=True),
                             ]),
                     Phase("main", [Step("main")]),
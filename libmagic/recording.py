@@ -0,0 +1,484 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+# Copyright Bernardo Heynemann <heynemann@gmail.com>
+
+# Licensed under the Open Software License ("OSL") v. 3.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.opensource.org/licenses/osl-3.0.php
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import mmap
+import struct
+import zlib
+
+from libmagic.errors import *
+from libmagic.models import ZONES
+
+# A game log is a header followed by records. Message names and card
+# definitions are written once, the first time they are needed, and events
+# then refer to them by small integer ids. Steps are not recorded: they
+# follow from the rules, so each event carries the point of the game it
+# happened at (turn, current position and step index) instead, along with
+# the acting position, its subject card index and the game hash after it.
+# Hit point changes carry the new hit points as their subject, offset by
+# HIT_POINTS_OFFSET so negative ones fit too, and draws the number of cards
+# drawn. Moves between zones are recorded as card_moved:<zone> events.
+#
+# Every few turns a keyframe holds the whole game state, so a replay can
+# start there instead of at the first turn. It is zlib compressed JSON, but
+# for the libraries' random generator states, which don't compress and are
+# packed after it instead. Closing a recorder writes an index of games and
+# keyframes by file offset, found through a trailer at the very end of the
+# file.
+MAGIC = "LMLG"
+VERSION = 2
+DEFINE_MESSAGE, DEFINE_CARDS, GAME, EVENT, KEYFRAME, INDEX = range(6)
+NO_POSITION = 0xff
+NO_SUBJECT = 0xffff
+HIT_POINTS_OFFSET = 0x8000
+INDEX_MAGIC = "LMIX"
+
+_HEADER = struct.Struct("<4sB")
+_BLOB = struct.Struct("<BHI")
+_EVENT = struct.Struct("<BHBHHBBQ")
+_KEYFRAME = struct.Struct("<BHIII")
+_RANDOM_STATE = struct.Struct("<625I")
+_TRAILER = struct.Struct("<Q4s")
+_pack_event = _EVENT.pack
+
+class Event(object):
+    __slots__ = ('message', 'position', 'subject', 'turn', 'current_position', 'step_index', 'hash')
+
+    def __init__(self, message, position, subject, turn, current_position, step_index, hash):
+        self.message = message
+        self.position = position
+        self.subject = subject
+        self.turn = turn
+        self.current_position = current_position
+        self.step_index = step_index
+        self.hash = hash
+
+    def __repr__(self):
+        return "Event(message=%r, position=%r, subject=%r, turn=%r, current_position=%r, step_index=%r, hash=%r)" % \
+                    (self.message, self.position, self.subject, self.turn, self.current_position, self.step_index, self.hash)
+
+class Keyframe(object):
+    # The game state at the first step of turn, after the first event events
+    # of its game. The state is only decoded when asked for.
+    __slots__ = ('turn', 'event', 'data', 'random_data')
+
+    def __init__(self, turn, event, data, random_data):
+        self.turn = turn
+        self.event = event
+        self.data = data
+        self.random_data = random_data
+
+    @property
+    def state(self):
+        state = json.loads(zlib.decompress(self.data))
+        offset = 0
+        for position in state["positions"]:
+            if position["random"] is not None:
+                version, gauss_next = position["random"]
+                position["random"] = [version, list(_RANDOM_STATE.unpack_from(self.random_data, offset)), gauss_next]
+                offset += _RANDOM_STATE.size
+        return state
+
+    def __repr__(self):
+        return "Keyframe(turn=%r, event=%r)" % (self.turn, self.event)
+
+class Recorder(object):
+    # Records games to stream, one after the other, so a long lived recorder
+    # only writes each message name and card definition once. Call
+    # watch(game) before game.initialize() and close() when done; a game
+    # that is stopped before it finished gets an event saying where it
+    # stopped. Moves undone with game.rollback() are dropped from the log;
+    # to keep them droppable, the records of a journaled game stay in the
+    # buffer until the recorder stops watching it, or until flush() is
+    # called. A keyframe is written every keyframe_interval turns, or never
+    # when it is None.
+
+    def __init__(self, stream, buffer_size=1 << 16, keyframe_interval=10):
+        self.stream = stream
+        self.buffer_size = buffer_size
+        self.keyframe_interval = keyframe_interval
+        self.buffer = bytearray(_HEADER.pack(MAGIC, VERSION))
+        self.offset = 0
+        self.message_ids = {}
+        self.definition_ids = {}
+        self.definitions = []
+        self.card_ids = {}
+        self.games = []
+        self.game = None
+        self.keyframe_topic = None
+        self.event_count = 0
+        self.next_keyframe = None
+        # (journal length, offset, event count, keyframe count, next keyframe)
+        # before each record of a journaled game, to drop rolled back ones.
+        self.marks = []
+        self.subscriptions = (("card_played", self.on_card_played),
+                              ("mana_generated", self.on_mana_generated),
+                              ("mana_paid", self.on_mana_paid),
+                              ("cards_drawn", self.on_cards_drawn),
+                              ("card_moved", self.on_card_moved),
+                              ("hit_points_changed", self.on_hit_points_changed),
+                              ("game_finished", self.on_game_finished),
+                              ("rolled_back", self.on_rolled_back))
+
+    @classmethod
+    def open(cls, path, buffer_size=1 << 16, keyframe_interval=10):
+        return cls(open(path, "wb"), buffer_size, keyframe_interval)
+
+    def watch(self, game):
+        self.stop()
+        self.game = game
+        game.bus.subscribe("game_started", self.on_game_started)
+
+    def stop(self):
+        game = self.game
+        if game is None:
+            return
+        if game.start_date and not game.end_date:
+            self.__event(self.__message_id("recording_stopped"), NO_POSITION, NO_SUBJECT)
+        game.bus.unsubscribe("game_started", self.on_game_started)
+        for message, func in self.subscriptions:
+            game.bus.unsubscribe(message, func)
+        if self.keyframe_topic is not None:
+            game.bus.unsubscribe(self.keyframe_topic, self.on_turn_started)
+            self.keyframe_topic = None
+        del self.marks[:]
+        self.game = None
+
+    def flush(self):
+        if self.buffer:
+            self.stream.write(self.buffer)
+            self.offset += len(self.buffer)
+            del self.buffer[:]
+        self.stream.flush()
+
+    def close(self):
+        self.stop()
+        self.__write_index()
+        self.flush()
+        self.stream.close()
+
+    def __write_index(self):
+        messages = sorted(self.message_ids, key=self.message_ids.get)
+        data = zlib.compress(json.dumps({"messages": messages,
+                                         "definitions": self.definitions,
+                                         "games": self.games}, separators=(",", ":")))
+        offset = self.offset + len(self.buffer)
+        self.buffer.extend(_BLOB.pack(INDEX, 0, len(data)))
+        self.buffer.extend(data)
+        self.buffer.extend(_TRAILER.pack(offset, INDEX_MAGIC))
+
+    def __write_blob(self, kind, identifier, value):
+        data = json.dumps(value, separators=(",", ":"))
+        self.buffer.extend(_BLOB.pack(kind, identifier, len(data)))
+        self.buffer.extend(data)
+
+    def __message_id(self, message):
+        if message not in self.message_ids:
+            self.message_ids[message] = len(self.message_ids)
+            self.__write_blob(DEFINE_MESSAGE, self.message_ids[message], message)
+        return self.message_ids[message]
+
+    def __definition_ids(self, cards):
+        # Card ids are keyed by content, since decks often build equal cards
+        # one by one; the definitions new to this log are written together.
+        ids = []
+        new_definitions = []
+        for card in cards:
+            card_key = (card.__class__, card.definition)
+            if card_key not in self.card_ids:
+                key = (card.__class__, card.name, card.color, card.cost.amounts, card.ability_types)
+                if key not in self.definition_ids:
+                    self.definition_ids[key] = len(self.definition_ids)
+                    new_definitions.append([card.__class__.__name__, card.name, card.color, list(card.cost.amounts),
+                                            [ability_type.__name__ for ability_type in card.ability_types]])
+                    self.definitions.append(new_definitions[-1])
+                self.card_ids[card_key] = self.definition_ids[key]
+            ids.append(self.card_ids[card_key])
+        if new_definitions:
+            self.__write_blob(DEFINE_CARDS, len(self.definition_ids) - len(new_definitions), new_definitions)
+        return ids
+
+    def __mark(self):
+        journal = self.game.journal
+        if journal is not None:
+            self.marks.append((len(journal), self.offset + len(self.buffer), self.event_count,
+                               len(self.games[-1][1]), self.next_keyframe))
+
+    def __event(self, message_id, position, subject):
+        game = self.game
+        buffer = self.buffer
+        if game.journal is not None:
+            self.__mark()
+        buffer.extend(_pack_event(EVENT, message_id, position, subject,
+                                  game.turn, game.current_position, game.step_index, game.hash))
+        self.event_count += 1
+        if len(buffer) >= self.buffer_size and not self.marks:
+            self.flush()
+
+    def __keyframe_state(self, game, random_data):
+        positions = []
+        for position in game.positions:
+            library = position.library
+            random_state = None
+            if library.random is not None:
+                version, internal_state, gauss_next = library.random.getstate()
+                random_data.extend(_RANDOM_STATE.pack(*internal_state))
+                random_state = (version, gauss_next)
+            positions.append({"library": [card.index for card in library.order],
+                              "cursor": library.cursor,
+                              "top": library.top,
+                              "bottom": library.bottom,
+                              "random": random_state,
+                              "hand": [card.index for card in position.hand],
+                              "battlefield": [card.index for card in position.battlefield],
+                              "tapped": [card.is_tapped for card in position.battlefield],
+                              "graveyard": [card.index for card in position.graveyard],
+                              "mana": list(position.mana.amounts),
+                              "turn_state": list(position.turn_state.values())})
+        return {"turn": game.turn,
+                "current_position": game.current_position,
+                "step_index": game.step_index,
+                "hash": game.hash,
+                "hit_points": game.game_mode.hit_points,
+                "positions": positions}
+
+    def on_game_started(self, game):
+        players = []
+        for position in game.positions:
+            deck = position.player.deck
+            players.append({"name": position.player.name,
+                            "deck": deck.name,
+                            "cards": self.__definition_ids(deck.cards)})
+        self.games.append([self.offset + len(self.buffer), []])
+        self.__write_blob(GAME, 0, {"seed": game.seed,
+                                    "game_mode": game.game_mode.__class__.__name__,
+                                    "players": players,
+                                    "hash": game.hash})
+
+        self.card_played_id = self.__message_id("card_played")
+        self.mana_generated_id = self.__message_id("mana_generated")
+        self.mana_paid_id = self.__message_id("mana_paid")
+        self.cards_drawn_id = self.__message_id("cards_drawn")
+        self.card_moved_ids = dict([(zone, self.__message_id("card_moved:%s" % zone)) for zone in ZONES])
+        self.hit_points_changed_id = self.__message_id("hit_points_changed")
+        self.game_finished_id = self.__message_id("game_finished")
+        for message, func in self.subscriptions:
+            game.bus.subscribe(message, func)
+
+        self.event_count = 0
+        if self.keyframe_interval:
+            # Keyframes are taken as the first step of a turn starts, so a
+            # replay restoring one goes on with the next step.
+            self.next_keyframe = game.turn + self.keyframe_interval
+            self.keyframe_topic = game.transitions[0][5]
+            game.bus.subscribe(self.keyframe_topic, self.on_turn_started)
+
+    def on_turn_started(self, game, phase, step):
+        if game.turn < self.next_keyframe:
+            return
+        self.next_keyframe = game.turn + self.keyframe_interval
+
+        self.__mark()
+        random_data = bytearray()
+        data = zlib.compress(json.dumps(self.__keyframe_state(game, random_data), separators=(",", ":")), 1)
+        self.games[-1][1].append([game.turn, self.offset + len(self.buffer)])
+        self.buffer.extend(_KEYFRAME.pack(KEYFRAME, game.turn, self.event_count, len(data), len(random_data)))
+        self.buffer.extend(data)
+        self.buffer.extend(random_data)
+        if len(self.buffer) >= self.buffer_size and not self.marks:
+            self.flush()
+
+    def on_card_played(self, game, position, card):
+        self.__event(self.card_played_id, position.index, card.index)
+
+    def on_mana_generated(self, game, position, card):
+        self.__event(self.mana_generated_id, position.index, card.index)
+
+    def on_mana_paid(self, game, position, card):
+        self.__event(self.mana_paid_id, position.index, card.index)
+
+    def on_cards_drawn(self, game, position, cards):
+        self.__event(self.cards_drawn_id, position.index, len(cards))
+
+    def on_card_moved(self, game, position, card, zone):
+        self.__event(self.card_moved_ids[zone], position.index, card.index)
+
+    def on_hit_points_changed(self, game, position, hit_points):
+        self.__event(self.hit_points_changed_id, position.index, hit_points + HIT_POINTS_OFFSET)
+
+    def on_game_finished(self, game, winner):
+        if winner is None:
+            position = NO_POSITION
+        else:
+            position = game.players.index(winner)
+        self.__event(self.game_finished_id, position, NO_SUBJECT)
+        if not self.marks:
+            self.flush()
+
+    def on_rolled_back(self, game, checkpoint):
+        length = checkpoint[0]
+        mark = None
+        while self.marks and self.marks[-1][0] > length:
+            mark = self.marks.pop()
+        if mark is None:
+            return
+
+        journal_length, offset, event_count, keyframes, next_keyframe = mark
+        if offset < self.offset:
+            raise InvalidOperationError("The rolled back moves were already flushed to the game log.")
+        del self.buffer[offset - self.offset:]
+        self.event_count = event_count
+        del self.games[-1][1][keyframes:]
+        self.next_keyframe = next_keyframe
+
+def _check_header(header):
+    if len(header) < _HEADER.size or _HEADER.unpack(header)[0] != MAGIC:
+        raise ValueError("Not a libmagic game log.")
+    if _HEADER.unpack(header)[1] > VERSION:
+        raise ValueError("Unsupported game log version %d." % _HEADER.unpack(header)[1])
+
+def _define_cards(definitions, first, values):
+    for offset, (card_type, name, color, cost, abilities) in enumerate(values):
+        definitions[first + offset] = {"type": card_type, "name": name, "color": color,
+                                       "cost": cost, "abilities": abilities}
+
+def _records(stream, messages, definitions, offset):
+    # Yields (offset, kind, record) for the records read from stream, which
+    # starts at offset, until the index or the end of the log. Definitions
+    # are collected into messages and definitions as they are read.
+    read = stream.read
+    while True:
+        kind = read(1)
+        if not kind:
+            return
+        start = offset
+        if ord(kind) == EVENT:
+            kind, message, position, subject, turn, current_position, step_index, hash = \
+                _EVENT.unpack(kind + read(_EVENT.size - 1))
+            offset += _EVENT.size
+            if position == NO_POSITION:
+                position = None
+            message = messages[message]
+            if subject == NO_SUBJECT:
+                subject = None
+            elif message == "hit_points_changed":
+                subject -= HIT_POINTS_OFFSET
+            yield start, EVENT, Event(message, position, subject, turn, current_position, step_index, hash)
+            continue
+
+        if ord(kind) == KEYFRAME:
+            kind, turn, event, length, random_length = _KEYFRAME.unpack(kind + read(_KEYFRAME.size - 1))
+            offset += _KEYFRAME.size + length + random_length
+            yield start, KEYFRAME, Keyframe(turn, event, read(length), read(random_length))
+            continue
+
+        kind, identifier, length = _BLOB.unpack(kind + read(_BLOB.size - 1))
+        offset += _BLOB.size + length
+        if kind == INDEX:
+            return
+        value = json.loads(read(length))
+        if kind == DEFINE_MESSAGE:
+            messages[identifier] = value
+        elif kind == DEFINE_CARDS:
+            _define_cards(definitions, identifier, value)
+        elif kind == GAME:
+            for player in value["players"]:
+                player["cards"] = [definitions[card] for card in player["cards"]]
+            yield start, GAME, value
+        else:
+            raise ValueError("Unknown game log record %d." % kind)
+
+_record_names = {GAME: "game", EVENT: "event", KEYFRAME: "keyframe"}
+
+def read_log(stream):
+    # Yields ("game", setup) with card ids resolved to their definitions,
+    # then ("event", Event) and ("keyframe", Keyframe) records, in the order
+    # they happened.
+    _check_header(stream.read(_HEADER.size))
+    for offset, kind, record in _records(stream, {}, {}, _HEADER.size):
+        yield _record_names[kind], record
+
+class LogReader(object):
+    # Random access to the games of a log file. The file is memory mapped and
+    # only the index is read when opening it; logs written without one, by
+    # recorders that were never closed, are scanned for it instead.
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        try:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.file.close()
+            raise ValueError("Not a libmagic game log.")
+        _check_header(self.data[:_HEADER.size])
+        self.messages = {}
+        self.definitions = {}
+        self.games = []
+        if not self.__read_index():
+            self.__scan()
+
+    def __read_index(self):
+        if len(self.data) < _HEADER.size + _TRAILER.size:
+            return False
+        offset, magic = _TRAILER.unpack_from(self.data, len(self.data) - _TRAILER.size)
+        if magic != INDEX_MAGIC:
+            return False
+        kind, identifier, length = _BLOB.unpack_from(self.data, offset)
+        index = json.loads(zlib.decompress(self.data[offset + _BLOB.size:offset + _BLOB.size + length]))
+        self.messages.update(enumerate(index["messages"]))
+        _define_cards(self.definitions, 0, index["definitions"])
+        self.games = index["games"]
+        return True
+
+    def __scan(self):
+        self.data.seek(_HEADER.size)
+        for offset, kind, record in _records(self.data, self.messages, self.definitions, _HEADER.size):
+            if kind == GAME:
+                self.games.append([offset, []])
+            elif kind == KEYFRAME:
+                self.games[-1][1].append([record.turn, offset])
+
+    def __len__(self):
+        return len(self.games)
+
+    def keyframe_turns(self, index):
+        return [turn for turn, offset in self.games[index][1]]
+
+    def read_game(self, index, from_turn=None):
+        # Returns the records of a game, like read_log. With from_turn, its
+        # events start at the last keyframe at or before that turn, which
+        # comes right after the game setup.
+        game_offset, keyframes = self.games[index]
+        self.data.seek(game_offset)
+        records = _records(self.data, self.messages, self.definitions, game_offset)
+        result = [("game", next(records)[2])]
+
+        if from_turn is not None:
+            offsets = [offset for turn, offset in keyframes if turn <= from_turn]
+            if offsets:
+                self.data.seek(offsets[-1])
+                records = _records(self.data, self.messages, self.definitions, offsets[-1])
+
+        for offset, kind, record in records:
+            if kind == GAME:
+                break
+            result.append((_record_names[kind], record))
+        return result
+
+    def close(self):
+        self.data.close()
+        self.file.close()
@@ -0,0 +1,280 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+# Copyright Bernardo Heynemann <heynemann@gmail.com>
+
+# Licensed under the Open Software License ("OSL") v. 3.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.opensource.org/licenses/osl-3.0.php
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import random
+import multiprocessing
+
+from libmagic import abilities, game_modes
+from libmagic.models import Game, Player, Deck, Card, Land, Cost, MANA_COLORS
+from libmagic.recording import read_log
+from libmagic.errors import *
+
+def _text(value):
+    if isinstance(value, unicode):
+        return value.encode("utf-8")
+    return value
+
+def _build_card(definition):
+    cost = Cost(**dict(zip(MANA_COLORS, definition["cost"])))
+    ability_types = [getattr(abilities, name) for name in definition["abilities"]]
+    return Card(_text(definition["name"]), cost, _text(definition["color"]), ability_types)
+
+def _build_land(definition):
+    return Land(_text(definition["name"]), _text(definition["color"]))
+
+# Builds a card from a recorded definition, by card type name; register other
+# card types here so their games can be replayed.
+card_builders = {
+    "Card": _build_card,
+    "Land": _build_land,
+}
+
+class RecordedGame(object):
+    # events holds the events of the game from number first_event on, which
+    # is only past zero for games read from a keyframe on.
+    def __init__(self, setup):
+        self.setup = setup
+        self.events = []
+        self.keyframes = []
+        self.first_event = 0
+
+def _group(records):
+    recorded = None
+    for kind, record in records:
+        if kind == "game":
+            if recorded is not None:
+                yield recorded
+            recorded = RecordedGame(record)
+        elif kind == "keyframe":
+            if not recorded.events and not recorded.keyframes:
+                recorded.first_event = record.event
+            recorded.keyframes.append(record)
+        else:
+            recorded.events.append(record)
+    if recorded is not None:
+        yield recorded
+
+def read_games(stream):
+    # Groups the records of a log into RecordedGames.
+    return _group(read_log(stream))
+
+def load_game(reader, index, from_turn=None):
+    # Reads a game from a LogReader; with from_turn, only from the last
+    # keyframe at or before that turn on.
+    return list(_group(reader.read_game(index, from_turn)))[0]
+
+def build_game(setup, cards=None):
+    # Creates and initializes the game a recording started from. cards caches
+    # built cards by definition, so games replayed together share them.
+    if setup["seed"] is None:
+        raise ReplayError("Games played without a seed can't be replayed.")
+    if cards is None:
+        cards = {}
+
+    game = Game(game_mode=getattr(game_modes, setup["game_mode"])(), seed=setup["seed"])
+    for player in setup["players"]:
+        deck_cards = []
+        for definition in player["cards"]:
+            key = repr(sorted(definition.items()))
+            if key not in cards:
+                if definition["type"] not in card_builders:
+                    raise ReplayError("Can't replay cards of type %s." % definition["type"])
+                cards[key] = card_builders[definition["type"]](definition)
+            deck_cards.append(cards[key])
+        deck = Deck(_text(player["deck"]), deck_cards)
+        game.add_player(Player(name=_text(player["name"]), deck=deck), supress_validation=True)
+    game.initialize()
+
+    # Castable cards only matter to agents; they are refreshed once at the end.
+    game.bus.unsubscribe('mana_generated', game.event_handler.refresh_castable_after_mana)
+    game.bus.unsubscribe('card_played', game.event_handler.refresh_castable_after_play)
+    game.bus.unsubscribe('step_started:cleanup', game.event_handler.refresh_castable_cards)
+    game.bus.unsubscribe('step_started:upkeep', game.event_handler.refresh_castable_cards)
+
+    if game.hash != setup["hash"]:
+        raise ReplayError("The replayed game doesn't start like the recorded one.")
+    return game
+
+def _advance_to(game, turn, current_position, step_index):
+    while (game.turn, game.current_position, game.step_index) != (turn, current_position, step_index):
+        if game.turn > turn or game.end_date:
+            raise ReplayError("The replayed game never reached turn %d, position %d, step %d." %
+                                (turn, current_position, step_index))
+        game.move_to_next_step()
+
+def _restore_keyframe(game, keyframe, positions, verify):
+    state = keyframe.state
+    snapshot = game.snapshot()
+    snapshot.turn = state["turn"]
+    snapshot.current_position = state["current_position"]
+    snapshot.step_index = state["step_index"]
+    snapshot.hit_points = dict([(_text(name), hit_points) for name, hit_points in state["hit_points"].iteritems()])
+    snapshot.hash = state["hash"]
+
+    position_states = []
+    for cards, position_state in zip(positions, state["positions"]):
+        library = [cards[index] for index in position_state["library"]]
+        position_states.append((tuple(library[position_state["cursor"]:]),
+                                tuple([cards[index] for index in position_state["hand"]]),
+                                tuple([cards[index] for index in position_state["battlefield"]]),
+                                tuple([cards[index] for index in position_state["graveyard"]]),
+                                tuple(position_state["tapped"]),
+                                tuple(position_state["mana"]),
+                                tuple(position_state["turn_state"])))
+    snapshot.positions = tuple(position_states)
+    game.restore(snapshot)
+
+    # Restoring sets the library cards in draw order; the rest of the lazy
+    # shuffle has to carry on exactly where the recorded game left it.
+    for position, cards, position_state in zip(game.positions, positions, state["positions"]):
+        library = position.library
+        library.order = [cards[index] for index in position_state["library"]]
+        library.cursor = position_state["cursor"]
+        library.top = position_state["top"]
+        library.bottom = position_state["bottom"]
+        library.random = None
+        if position_state["random"] is not None:
+            version, internal_state, gauss_next = position_state["random"]
+            library.random = random.Random()
+            library.random.setstate((version, tuple(internal_state), gauss_next))
+
+    if verify and game.compute_hash() != state["hash"]:
+        raise ReplayError("The keyframe at turn %d doesn't match its game." % keyframe.turn)
+
+def _pick_keyframe(recorded, until_turn):
+    keyframes = [keyframe for keyframe in recorded.keyframes if keyframe.event >= recorded.first_event]
+    if until_turn is not None:
+        keyframes = [keyframe for keyframe in keyframes if keyframe.turn <= until_turn]
+        if keyframes:
+            return keyframes[-1]
+    elif recorded.first_event and keyframes:
+        return keyframes[0]
+
+    if recorded.first_event:
+        raise ReplayError("The recording starts at event %d, after turn %d." %
+                            (recorded.first_event, until_turn or 0))
+    return None
+
+def replay(recorded, until_turn=None, verify=True, cards=None):
+    # Rebuilds a recorded game and re-runs its events, checking the game hash
+    # after each one when verify is set. With until_turn, the game stops at
+    # the first decision of that turn instead of at the end of the recording,
+    # starting from the last keyframe before it when there is one.
+    game = build_game(recorded.setup, cards)
+    positions = [dict([(card.index, card) for card in position.library.remaining() + list(position.hand)])
+                    for position in game.positions]
+
+    first_event = recorded.first_event
+    keyframe = _pick_keyframe(recorded, until_turn)
+    if keyframe is not None:
+        _restore_keyframe(game, keyframe, positions, verify)
+        first_event = keyframe.event
+
+    events = recorded.events[first_event - recorded.first_event:]
+    for number, event in enumerate(events, first_event):
+        if until_turn is not None and event.turn >= until_turn:
+            break
+        _advance_to(game, event.turn, event.current_position, event.step_index)
+
+        if event.message == "card_played":
+            card = positions[event.position][event.subject]
+            game.positions[event.position].player.play(card)
+        elif event.message == "mana_generated":
+            positions[event.position][event.subject].GenerateManaAndTap()
+        elif event.message == "mana_paid":
+            game.positions[event.position].pay_mana(positions[event.position][event.subject].cost)
+        elif event.message == "cards_drawn":
+            game.positions[event.position].draw(event.subject)
+        elif event.message.startswith("card_moved:"):
+            card = positions[event.position][event.subject]
+            game.positions[event.position].move_card(card, _text(event.message[len("card_moved:"):]))
+        elif event.message == "hit_points_changed":
+            game.game_mode.set_hit_points_for(game.positions[event.position].player.name, event.subject)
+        elif event.message == "game_finished":
+            winner = None
+            if event.position is not None:
+                winner = game.players[event.position]
+            if not game.end_date:
+                # Finished by whoever drove the game, like a concession.
+                game.finish(winner)
+            elif game.winner is not winner:
+                raise ReplayError("The replayed game didn't finish like the recorded one.")
+
+        if verify and game.hash != event.hash:
+            raise ReplayError("The replayed game diverged at event %d (%s, turn %d)." %
+                                (number, event.message, event.turn))
+
+    if until_turn is not None:
+        while game.turn < until_turn and not game.end_date:
+            game.move_to_next_step()
+        if game.current_step.automatic and not game.end_date:
+            game.move_to_next_step()
+
+    for position in game.positions:
+        position.refresh_castable()
+    return game
+
+class ReplayResult(object):
+    def __init__(self, source, index, winner, turns, error=None):
+        self.source = source
+        self.index = index
+        self.winner = winner
+        self.turns = turns
+        self.error = error
+
+    def __repr__(self):
+        return "ReplayResult(source=%r, index=%r, winner=%r, turns=%r, error=%r)" % \
+                    (self.source, self.index, self.winner, self.turns, self.error)
+
+def replay_file(path, verify=True):
+    results = []
+    cards = {}
+    with open(path, "rb") as stream:
+        for index, recorded in enumerate(read_games(stream)):
+            try:
+                game = replay(recorded, verify=verify, cards=cards)
+            except (ReplayError, InvalidOperationError), error:
+                results.append(ReplayResult(path, index, None, None, str(error)))
+                continue
+            winner = None
+            if game.winner is not None:
+                winner = game.players.index(game.winner)
+            results.append(ReplayResult(path, index, winner, game.turn))
+    return results
+
+def replay_logs(paths, workers=None, verify=True):
+    # Yields a ReplayResult per recorded game, replaying log files in
+    # parallel; workers=1 replays them in the calling process.
+    if workers == 1:
+        for path in paths:
+            for result in replay_file(path, verify):
+                yield result
+        return
+
+    pool = multiprocessing.Pool(processes=workers)
+    try:
+        for results in pool.imap_unordered(_replay_task, [(path, verify) for path in paths]):
+            for result in results:
+                yield result
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+def _replay_task(task):
+    path, verify = task
+    return replay_file(path, verify)
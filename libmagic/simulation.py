@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+# Copyright Bernardo Heynemann <heynemann@gmail.com>
+
+# Licensed under the Open Software License ("OSL") v. 3.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.opensource.org/licenses/osl-3.0.php
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+import random
+import multiprocessing
+
+from libmagic.models import Game, Player, Deck, Card, Land, Cost
+from libmagic.game_modes import GameMode
+from libmagic.errors import *
+
+class GameResult(object):
+    def __init__(self, index, matchup, seed, winner, turns, duration):
+        self.index = index
+        self.matchup = matchup
+        self.seed = seed
+        self.winner = winner
+        self.turns = turns
+        self.duration = duration
+
+    def __repr__(self):
+        return "GameResult(index=%r, matchup=%r, seed=%r, winner=%r, turns=%r, duration=%.6f)" % \
+                    (self.index, self.matchup, self.seed, self.winner, self.turns, self.duration)
+
+def mixed_deck(color, size=20):
+    # A sample deck of a single color for simulations: three lands for every
+    # two spells, each spell with its own name.
+    lands = size * 3 // 5
+    cards = [Land("%s land" % color, color) for cnt in range(lands)]
+    cards += [Card("%s card %d" % (color, cnt), Cost(colorless=cnt % 3, **{color: 1})) for cnt in range(size - lands)]
+    return Deck("%s deck" % color, cards)
+
+def play_first_playable_card(game, position):
+    if game.current_step.name != "main":
+        return
+
+    for card in list(position.battlefield):
+        if not card.is_tapped:
+            try:
+                card.GenerateManaAndTap()
+            except AttributeError:
+                pass
+
+    for card in list(position.hand):
+        try:
+            position.player.play(card)
+        except InvalidOperationError:
+            continue
+
+def run_game(decks, agent=play_first_playable_card, max_turns=50, supress_validation=False, seed=None):
+    game = Game(seed=seed)
+    for player_index, deck in enumerate(decks):
+        game.add_player(Player(name="Player %d" % (player_index + 1), deck=deck), supress_validation=supress_validation)
+
+    started = time.time()
+    game.initialize()
+    while not game.end_date and game.turn <= max_turns:
+        agent(game, game.positions[game.current_position])
+        if game.end_date:
+            break
+        game.advance_to_next_decision()
+    if not game.end_date:
+        game.finish(winner=None)
+    duration = time.time() - started
+
+    winner = None
+    if game.winner is not None:
+        winner = game.players.index(game.winner)
+
+    return winner, min(game.turn, max_turns), duration
+
+# Per-worker state of pool workers, set once by _initialize_worker so each
+# game only ships its indexes over the pipe. Games played in the calling
+# process don't use it, so runs there can be interleaved.
+_worker_matchups = None
+_worker_agent = None
+_worker_max_turns = None
+
+def _initialize_worker(matchups, agent, max_turns):
+    global _worker_matchups, _worker_agent, _worker_max_turns
+    _worker_matchups = matchups
+    _worker_agent = agent
+    _worker_max_turns = max_turns
+
+def game_seed(seed, game_index):
+    # Each game gets its own stream, derived only from the run seed and the
+    # game index, so any game of a batch can be replayed alone with run_game.
+    return (seed << 32) + game_index
+
+def _play_task(task, matchups, agent, max_turns):
+    game_index, matchup_index, seed = task
+    winner, turns, duration = run_game(matchups[matchup_index],
+                                       agent=agent,
+                                       max_turns=max_turns,
+                                       supress_validation=True,
+                                       seed=seed)
+    return GameResult(game_index, matchup_index, seed, winner, turns, duration)
+
+def _run_task(task):
+    return _play_task(task, _worker_matchups, _worker_agent, _worker_max_turns)
+
+def validate_matchups(matchups, game_mode=None):
+    game_mode = game_mode or GameMode()
+    for decks in matchups:
+        if len(decks) < 2:
+            raise RuntimeError("You can't start a game with less than 2 players.")
+        for deck in decks:
+            is_valid, message = game_mode.validate_deck(deck)
+            if not is_valid:
+                raise InvalidOperationError(message)
+
+def simulate(matchups, games=1, workers=None, agent=play_first_playable_card, max_turns=50, chunksize=16, seed=None):
+    # Returns an iterator with a GameResult per game as games finish, in no
+    # particular order. Decks are validated right away, before any game is
+    # played. Workers live for the whole run, so imports and deck setup are
+    # paid once per worker; workers=1 plays every game in the calling
+    # process. Without a seed the run draws one, so every GameResult still
+    # has a seed to replay its game with.
+    matchups = [tuple(decks) for decks in matchups]
+    validate_matchups(matchups)
+    if seed is None:
+        seed = random.SystemRandom().getrandbits(32)
+
+    tasks = ((game_index, game_index // games, game_seed(seed, game_index))
+                for game_index in range(len(matchups) * games))
+    return _run_tasks(matchups, tasks, workers, agent, max_turns, chunksize)
+
+def _run_tasks(matchups, tasks, workers, agent, max_turns, chunksize):
+    if workers == 1:
+        for task in tasks:
+            yield _play_task(task, matchups, agent, max_turns)
+        return
+
+    pool = multiprocessing.Pool(processes=workers,
+                                initializer=_initialize_worker,
+                                initargs=(matchups, agent, max_turns))
+    try:
+        for result in pool.imap_unordered(_run_task, tasks, chunksize):
+            yield result
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+# Copyright Bernardo Heynemann <heynemann@gmail.com>
+
+# Licensed under the Open Software License ("OSL") v. 3.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.opensource.org/licenses/osl-3.0.php
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from libmagic.models import Card, Land, ZONES, MANA_COLORS
+from libmagic.phases import default_phases
+from libmagic.errors import *
+
+LIBRARY, HAND, BATTLEFIELD, GRAVEYARD = range(len(ZONES))
+NO_CARD = -1
+COLORLESS = MANA_COLORS.index("colorless")
+
+class VectorGame(object):
+    # Steps many free for all games of the same decks together, holding each
+    # piece of state in a numpy array indexed by game, position and deck
+    # index. Only plain Cards and Lands are supported; the object based Game
+    # is the reference implementation these rules are checked against.
+
+    def __init__(self, decks, games, seed=None, phases=default_phases):
+        if numpy is None:
+            raise ImportError("The vector engine requires numpy.")
+        if len(decks) < 2:
+            raise RuntimeError("You can't start a game with less than 2 players.")
+
+        self.games = games
+        self.players = len(decks)
+        self.transitions = [(step.name, step.automatic, step.optional) for phase in phases for step in phase.steps]
+        self.__load_decks([deck.cards for deck in decks])
+
+        size = self.deck_sizes.max()
+        self.library = numpy.full((games, self.players, size), NO_CARD, dtype=numpy.int16)
+        self.library_cursor = numpy.zeros((games, self.players), dtype=numpy.int16)
+        self.zone = numpy.full((games, self.players, size), NO_CARD, dtype=numpy.int8)
+        self.tapped = numpy.zeros((games, self.players, size), dtype=bool)
+        self.mana = numpy.zeros((games, self.players, len(MANA_COLORS)), dtype=numpy.int32)
+        self.hit_points = numpy.full((games, self.players), 20, dtype=numpy.int32)
+        self.has_played_land = numpy.zeros((games, self.players), dtype=bool)
+        self.turn = numpy.ones(games, dtype=numpy.int32)
+        self.current_position = numpy.zeros(games, dtype=numpy.int32)
+        self.step_index = 0
+
+        random = numpy.random.RandomState(seed)
+        for player in range(self.players):
+            deck_size = self.deck_sizes[player]
+            self.library[:, player, :deck_size] = random.rand(games, deck_size).argsort(axis=1)
+            self.zone[:, player, :deck_size] = LIBRARY
+            self.__draw(player, numpy.ones(games, dtype=bool), 7)
+
+        self.__decide_first_player()
+        self.__run_step_rules()
+        if self.transitions[0][1]:
+            self.move_to_next_step()
+
+    @classmethod
+    def from_games(cls, games):
+        if numpy is None:
+            raise ImportError("The vector engine requires numpy.")
+
+        reference = games[0]
+        vector = cls.__new__(cls)
+        vector.games = len(games)
+        vector.players = len(reference.positions)
+        vector.transitions = [(transition[1].name, transition[2], transition[1].optional) for transition in reference.transitions]
+        vector.__load_decks([position.player.deck.cards for position in reference.positions])
+
+        shape = (vector.games, vector.players, vector.deck_sizes.max())
+        vector.library = numpy.full(shape, NO_CARD, dtype=numpy.int16)
+        vector.library_cursor = numpy.zeros(shape[:2], dtype=numpy.int16)
+        vector.zone = numpy.full(shape, NO_CARD, dtype=numpy.int8)
+        vector.tapped = numpy.zeros(shape, dtype=bool)
+        vector.mana = numpy.zeros(shape[:2] + (len(MANA_COLORS),), dtype=numpy.int32)
+        vector.hit_points = numpy.zeros(shape[:2], dtype=numpy.int32)
+        vector.has_played_land = numpy.zeros(shape[:2], dtype=bool)
+        vector.turn = numpy.array([game.turn for game in games], dtype=numpy.int32)
+        vector.current_position = numpy.array([game.current_position for game in games], dtype=numpy.int32)
+        vector.step_index = reference.step_index
+
+        for game_index, game in enumerate(games):
+            if game.step_index != reference.step_index:
+                raise InvalidOperationError("Every game must be at the same step to be stepped together.")
+            for position in game.positions:
+                player = position.index
+                if [card.definition for card in position.player.deck.cards] != vector.definitions[player]:
+                    raise InvalidOperationError("Every game must be played with the same decks.")
+
+                library = [card.index for card in position.library.cards]
+                cursor = vector.deck_sizes[player] - len(library)
+                vector.library_cursor[game_index, player] = cursor
+                vector.library[game_index, player, cursor:cursor + len(library)] = library
+                for zone_code, zone in enumerate(ZONES):
+                    for card in position.zone(zone):
+                        vector.zone[game_index, player, card.index] = zone_code
+                        vector.tapped[game_index, player, card.index] = card.is_tapped
+                vector.mana[game_index, player] = position.mana.amounts
+                vector.hit_points[game_index, player] = position.hit_points
+                vector.has_played_land[game_index, player] = position.turn_state.has_played_land
+
+        return vector
+
+    def __load_decks(self, decks):
+        self.definitions = []
+        self.deck_sizes = numpy.array([len(cards) for cards in decks])
+        size = self.deck_sizes.max()
+        self.costs = numpy.zeros((self.players, size, len(MANA_COLORS)), dtype=numpy.int32)
+        self.is_land = numpy.zeros((self.players, size), dtype=bool)
+        self.colors = numpy.full((self.players, size), NO_CARD, dtype=numpy.int8)
+
+        for player, cards in enumerate(decks):
+            self.definitions.append([card.definition for card in cards])
+            for index, card in enumerate(cards):
+                if card.__class__ not in (Card, Land):
+                    raise InvalidOperationError("The vector engine only plays Card and Land, not %s." % card.__class__.__name__)
+                self.costs[player, index] = card.cost.amounts
+                if card.__class__ is Land:
+                    self.is_land[player, index] = True
+                    self.colors[player, index] = MANA_COLORS.index(card.color)
+
+    def __draw(self, player, games, number_of_cards):
+        for draw in range(number_of_cards):
+            can_draw = games & (self.library_cursor[:, player] < self.deck_sizes[player])
+            game_indexes = numpy.flatnonzero(can_draw)
+            cards = self.library[game_indexes, player, self.library_cursor[game_indexes, player]]
+            self.zone[game_indexes, player, cards] = HAND
+            self.library_cursor[game_indexes, player] += 1
+
+    def __decide_first_player(self):
+        # Mirrors FreeForAll.decide_first_player: compare the bottom cards of
+        # every library, going up until someone other than the first
+        # position has the single greatest cost.
+        undecided = numpy.ones(self.games, dtype=bool)
+        library_sizes = self.deck_sizes - 7
+        for depth in range(1, library_sizes.min() + 1):
+            costs = numpy.zeros((self.games, self.players), dtype=numpy.int32)
+            for player in range(self.players):
+                cards = self.library[:, player, self.deck_sizes[player] - depth]
+                costs[:, player] = self.costs[player, cards].sum(axis=1)
+            greatest = costs.argmax(axis=1)
+            decided = undecided & (costs.max(axis=1) > 0) & (greatest > 0)
+            self.current_position[decided] = greatest[decided]
+            undecided &= ~decided
+
+    def __current(self):
+        return numpy.arange(self.games), self.current_position
+
+    def __run_step_rules(self):
+        name = self.transitions[self.step_index][0]
+        games, current = self.__current()
+        if name == "upkeep":
+            self.has_played_land[games, current] = False
+            battlefield_lands = (self.zone[games, current] == BATTLEFIELD) & self.is_land[current]
+            self.tapped[games, current] &= ~battlefield_lands
+        elif name == "cleanup":
+            self.mana[games, current] = 0
+
+    def __advance(self, stop_at_decisions):
+        for attempt in range(len(self.transitions)):
+            self.step_index += 1
+            if self.step_index == len(self.transitions):
+                self.step_index = 0
+                self.turn[self.current_position == self.players - 1] += 1
+                self.current_position = (self.current_position + 1) % self.players
+            self.__run_step_rules()
+
+            name, automatic, optional = self.transitions[self.step_index]
+            if not automatic and not (stop_at_decisions and optional):
+                return
+
+    def move_to_next_step(self):
+        self.__advance(stop_at_decisions=False)
+
+    def advance_to_next_decision(self):
+        # Plain cards and lands never act during optional steps, so those
+        # are never decision points here.
+        self.__advance(stop_at_decisions=True)
+
+    def is_satisfied_by(self, costs, pools):
+        # Cost.is_satisfied_by for one (cost, pool) pair per row.
+        colored = slice(0, COLORLESS)
+        has_colors = (pools[:, colored] >= costs[:, colored]).all(axis=1)
+        available = (pools[:, colored] - costs[:, colored]).sum(axis=1) + pools[:, COLORLESS]
+        return has_colors & (available >= costs[:, COLORLESS])
+
+    def play(self, cards):
+        # Plays cards[g] for the current position of every game g (NO_CARD
+        # skips a game). Plays Player.play would reject are skipped instead
+        # of raising; the result tells which games played their card.
+        cards = numpy.asarray(cards)
+        games, current = self.__current()
+        valid = cards != NO_CARD
+        safe_cards = numpy.where(valid, cards, 0)
+
+        valid &= self.zone[games, current, safe_cards] == HAND
+        is_land = self.is_land[current, safe_cards]
+        valid &= ~(is_land & self.has_played_land[games, current])
+        valid &= self.is_satisfied_by(self.costs[current, safe_cards], self.mana[games, current])
+
+        played = numpy.flatnonzero(valid)
+        self.zone[played, current[played], cards[played]] = BATTLEFIELD
+        lands = played[is_land[played]]
+        self.has_played_land[lands, current[lands]] = True
+        return valid
+
+    def generate_mana(self, cards):
+        # Taps cards[g] of the current position of every game g for mana, the
+        # way GenerateManaAndTapAbility does. Returns which games tapped.
+        cards = numpy.asarray(cards)
+        games, current = self.__current()
+        valid = cards != NO_CARD
+        safe_cards = numpy.where(valid, cards, 0)
+
+        valid &= self.is_land[current, safe_cards]
+        valid &= self.zone[games, current, safe_cards] == BATTLEFIELD
+        valid &= ~self.tapped[games, current, safe_cards]
+
+        tapped = numpy.flatnonzero(valid)
+        self.tapped[tapped, current[tapped], cards[tapped]] = True
+        self.mana[tapped, current[tapped], self.colors[current[tapped], cards[tapped]]] += 1
+        return valid
+
+    def cards_in(self, zone, game_index, player):
+        return sorted(numpy.flatnonzero(self.zone[game_index, player] == ZONES.index(zone)))
+
+    def library_cards(self, game_index, player):
+        cursor = self.library_cursor[game_index, player]
+        return list(self.library[game_index, player, cursor:self.deck_sizes[player]])
+
+    def equals(self, other):
+        if self.step_index != other.step_index:
+            return False
+        for player in range(self.players):
+            for game_index in range(self.games):
+                if self.library_cards(game_index, player) != other.library_cards(game_index, player):
+                    return False
+        return (numpy.array_equal(self.zone, other.zone) and
+                numpy.array_equal(self.tapped, other.tapped) and
+                numpy.array_equal(self.mana, other.mana) and
+                numpy.array_equal(self.hit_points, other.hit_points) and
+                numpy.array_equal(self.has_played_land, other.has_played_land) and
+                numpy.array_equal(self.turn, other.turn) and
+                numpy.array_equal(self.current_position, other.current_position))
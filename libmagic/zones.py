@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+# Copyright Bernardo Heynemann <heynemann@gmail.com>
+
+# Licensed under the Open Software License ("OSL") v. 3.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.opensource.org/licenses/osl-3.0.php
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Marks the slot of a card that left the zone until the next compaction.
+_HOLE = object()
+
+class Zone(object):
+    # An ordered container of cards with O(1) membership, append and removal.
+    # Removed cards leave a hole that is compacted away lazily, the next time
+    # a positional operation needs real indexes. Cards are also indexed by
+    # (card class, tapped state), so select() answers queries like "untapped
+    # lands" without scanning the zone; cards call update() when tapped.
+
+    def __init__(self, cards=()):
+        self.reset(cards)
+
+    def reset(self, cards):
+        self._cards = list(cards)
+        self._slots = {}
+        self._keys = {}
+        self._index = {}
+        self._holes = 0
+        for slot, card in enumerate(self._cards):
+            self._slots[card] = slot
+            self.__add_to_index(card)
+
+    def __add_to_index(self, card):
+        key = (card.__class__, card.is_tapped)
+        self._keys[card] = key
+        self._index.setdefault(key, set()).add(card)
+
+    def __remove_from_index(self, card):
+        key = self._keys.pop(card)
+        bucket = self._index[key]
+        bucket.discard(card)
+        if not bucket:
+            del self._index[key]
+
+    def __compact(self):
+        if not self._holes:
+            return
+        self._cards = [card for card in self._cards if card is not _HOLE]
+        self._slots = dict([(card, slot) for slot, card in enumerate(self._cards)])
+        self._holes = 0
+
+    def update(self, card):
+        if card in self._keys and self._keys[card] != (card.__class__, card.is_tapped):
+            self.__remove_from_index(card)
+            self.__add_to_index(card)
+
+    def select(self, card_type=object, tapped=None):
+        cards = []
+        for (cls, is_tapped), bucket in self._index.iteritems():
+            if issubclass(cls, card_type) and (tapped is None or is_tapped == tapped):
+                cards.extend(bucket)
+        cards.sort(key=self._slots.__getitem__)
+        return cards
+
+    def append(self, card):
+        self._slots[card] = len(self._cards)
+        self._cards.append(card)
+        self.__add_to_index(card)
+
+    def extend(self, cards):
+        for card in cards:
+            self.append(card)
+
+    def remove(self, card):
+        if card not in self._slots:
+            raise ValueError("Zone.remove(card): card not in zone")
+        self._cards[self._slots.pop(card)] = _HOLE
+        self._holes += 1
+        self.__remove_from_index(card)
+        if self._holes > len(self._slots):
+            self.__compact()
+
+    def insert(self, index, card):
+        self.__compact()
+        self._cards.insert(index, card)
+        for slot in range(index, len(self._cards)):
+            self._slots[self._cards[slot]] = slot
+        self.__add_to_index(card)
+
+    def index(self, card):
+        if card not in self._slots:
+            raise ValueError("Zone.index(card): card not in zone")
+        self.__compact()
+        return self._slots[card]
+
+    def __getitem__(self, key):
+        self.__compact()
+        return self._cards[key]
+
+    def __setitem__(self, key, value):
+        self.__compact()
+        cards = list(self._cards)
+        cards[key] = value
+        self.reset(cards)
+
+    def __delitem__(self, key):
+        self.__compact()
+        cards = list(self._cards)
+        del cards[key]
+        self.reset(cards)
+
+    def __getslice__(self, start, stop):
+        return self.__getitem__(slice(start, stop))
+
+    def __setslice__(self, start, stop, value):
+        self.__setitem__(slice(start, stop), value)
+
+    def __delslice__(self, start, stop):
+        self.__delitem__(slice(start, stop))
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __contains__(self, card):
+        return card in self._slots
+
+    def __iter__(self):
+        for card in self._cards:
+            if card is not _HOLE:
+                yield card
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+    def __eq__(self, other):
+        if not isinstance(other, (Zone, list, tuple)):
+            return NotImplemented
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    def __repr__(self):
+        return "Zone(%r)" % list(self)
@@ -0,0 +1,31 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+# Copyright Bernardo Heynemann <heynemann@gmail.com>
+
+# Licensed under the Open Software License ("OSL") v. 3.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.opensource.org/licenses/osl-3.0.php
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from benchmarks.run import run_benchmarks, compare
+
+def test_benchmarks_report_operations_and_rates():
+    results = run_benchmarks(["validate_deck", "bus_publish_fanout"], repeat=1)
+
+    assert sorted(results) == ["bus_publish_fanout", "validate_deck"]
+    assert results["validate_deck"]["operations"] == 100
+    assert results["validate_deck"]["ops_per_second"] > 0
+
+def test_benchmark_compare_flags_slowdowns_beyond_tolerance():
+    baseline = {"a": {"ops_per_second": 100.0}, "b": {"ops_per_second": 100.0}, "c": {"ops_per_second": 100.0}}
+    results = {"a": {"ops_per_second": 85.0}, "b": {"ops_per_second": 75.0}, "d": {"ops_per_second": 1.0}}
+
+    assert compare(results, baseline, tolerance=0.2) == [("a", 100.0, 85.0, False), ("b", 100.0, 75.0, True)]
@@ -15,7 +15,11 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import json
+from StringIO import StringIO
+
 from libmagic import Bus
+from libmagic.bus import Timing
 
 def test_can_create_bus():
     bus = Bus()
@@ -71,3 +75,121 @@ def test_can_subscribe_and_get_results_on_publish_for_more_than_one_subscriber()
     assert results[0] == "text1"
     assert results[1] == "text2"
 
+
+def test_topic_qualifies_message():
+    assert Bus.topic("step_started", "upkeep") == "step_started:upkeep"
+
+def test_subscribers_to_a_topic_only_get_that_topic():
+    results = []
+    def proc(x):
+        results.append(x)
+
+    bus = Bus()
+    bus.subscribe(Bus.topic("some message", "a"), proc)
+
+    bus.publish("some message", x="plain")
+    bus.publish(Bus.topic("some message", "b"), x="b")
+    bus.publish(Bus.topic("some message", "a"), x="a")
+
+    assert results == ["a"]
+
+def test_can_unsubscribe():
+    func = lambda x: x
+    bus = Bus()
+    bus.subscribe("some message", func)
+    bus.unsubscribe("some message", func)
+
+    assert "some message" not in bus.subscribers
+
+def test_unsubscribing_unknown_function_does_nothing():
+    bus = Bus()
+    bus.unsubscribe("some message", lambda x: x)
+
+    assert not bus.subscribers
+
+def test_bus_is_not_instrumented_by_default():
+    bus = Bus()
+
+    assert not bus.is_instrumented
+    assert 'publish' not in bus.__dict__
+
+def test_instrumented_bus_still_calls_subscribers():
+    results = []
+    bus = Bus()
+    bus.subscribe("some message", lambda x: results.append(x))
+    bus.instrument()
+
+    bus.publish("some message", x="a")
+
+    assert results == ["a"]
+
+def some_subscriber(x):
+    pass
+
+def test_instrumented_bus_counts_calls_per_message_and_subscriber():
+    bus = Bus()
+    bus.subscribe("some message", some_subscriber)
+    bus.instrument()
+
+    bus.publish("some message", x=1)
+    bus.publish("some message", x=2)
+    bus.publish("other message", x=3)
+
+    stats = bus.stats()
+    assert stats["some message"]["calls"] == 2
+    assert stats["other message"]["calls"] == 1
+    assert stats["other message"]["subscribers"] == {}
+
+    subscriber = stats["some message"]["subscribers"]["tests.unit.test_bus.some_subscriber"]
+    assert subscriber["calls"] == 2
+    assert 0 <= subscriber["p50"] <= subscriber["p99"] <= subscriber["max"]
+    assert subscriber["total"] <= stats["some message"]["total"]
+
+def test_instrumented_bus_keeps_fixed_size_timings():
+    bus = Bus()
+    bus.subscribe("some message", some_subscriber)
+    bus.instrument()
+
+    bus.publish("some message", x=1)
+    sizes = (len(bus.message_timings["some message"].counts),
+             len(bus.subscriber_timings["some message"][some_subscriber].counts))
+    for x in range(1000):
+        bus.publish("some message", x=x)
+
+    assert bus.stats()["some message"]["calls"] == 1001
+    assert (len(bus.message_timings["some message"].counts),
+            len(bus.subscriber_timings["some message"][some_subscriber].counts)) == sizes
+
+def test_timing_estimates_percentiles_from_buckets():
+    timing = Timing()
+    for millisecond in range(1, 101):
+        timing.add(millisecond / 1000.0)
+
+    summary = timing.summary()
+    assert summary["calls"] == 100
+    assert abs(summary["total"] - 5.05) < 1e-9
+    assert summary["max"] == 0.1
+    assert 0.05 <= summary["p50"] <= 0.05 * 1.2
+    assert 0.095 <= summary["p95"] <= 0.1
+    assert summary["p99"] <= summary["max"]
+
+def test_stopping_instrumentation_keeps_stats_and_restores_publish():
+    bus = Bus()
+    bus.instrument()
+    bus.publish("some message")
+    bus.stop_instrumenting()
+    bus.publish("some message")
+
+    assert not bus.is_instrumented
+    assert bus.stats()["some message"]["calls"] == 1
+
+def test_instrumented_bus_dumps_stats_as_json():
+    bus = Bus()
+    bus.subscribe("some message", some_subscriber)
+    bus.instrument()
+    bus.publish("some message", x=1)
+
+    stream = StringIO()
+    bus.dump_stats(stream)
+
+    assert json.loads(stream.getvalue())["some message"]["calls"] == 1
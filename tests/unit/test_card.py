@@ -158,3 +158,153 @@ def test_generating_mana_out_of_a_tapped_land_raises():
 
     assert_raises(InvalidOperationError, land_to_play.GenerateManaAndTap, exc_pattern=r"The player can't generate mana out of a tapped card.")
 
+
+def test_card_keeps_its_definition():
+    card = Card("some card", Cost(green=1))
+    assert card.definition.name == "some card"
+    assert card.definition.cost is card.cost
+
+def test_card_definitions_cant_be_changed():
+    card = Card("some card", Cost(green=1))
+    assert_raises(InvalidOperationError, setattr, card.definition, "name", "other", exc_pattern=r"Card definitions are shared by every game and can't be changed.")
+
+def test_land_definition_keeps_color_and_abilities():
+    land = Land("some land", color="green")
+    assert land.color == "green"
+    assert land.ability_types
+
+def test_instantiated_card_shares_definition():
+    card = Card("some card", Cost(green=1))
+    instance = card.instantiate(None, None)
+
+    assert instance is not card
+    assert isinstance(instance, Card)
+    assert instance.definition is card.definition
+    assert instance.cost is card.cost
+
+def test_instantiated_cards_have_their_own_state():
+    land = Land("some land", color="green")
+    land_a = land.instantiate(None, None)
+    land_b = land.instantiate(None, None)
+
+    land_a.is_tapped = True
+
+    assert not land_b.is_tapped
+    assert not land.is_tapped
+    assert land_a.zone == "library"
+
+class Creature(Card):
+    def __init__(self, name, cost, power, toughness):
+        super(Creature, self).__init__(name, cost)
+        self.power = power
+        self.toughness = toughness
+        self.counters = []
+
+def test_instantiated_cards_keep_subclass_fields():
+    creature = Creature("some creature", Cost(green=1), power=2, toughness=3)
+    instance = creature.instantiate(None, None)
+
+    assert instance.power == 2
+    assert instance.toughness == 3
+    assert instance.counters == []
+    assert instance.counters is not creature.counters
+
+def test_game_cards_keep_subclass_fields():
+    new_game = Game()
+    deck = Deck("creatures", [Creature("creature %d" % (cnt // 4), Cost(green=1), power=cnt, toughness=1) for cnt in range(20)])
+    bernardo = Player(name="Bernardo", deck=deck)
+    john = Player(name="John", deck=data.black_land_deck)
+    new_game.add_player(bernardo)
+    new_game.add_player(john)
+
+    new_game.initialize()
+
+    cards = bernardo.position.hand + bernardo.position.library.cards
+    assert sorted(card.power for card in cards) == range(20)
+    assert all(card.toughness == 1 for card in cards)
+
+def test_deep_copied_card_shares_definition():
+    card = Card("some card", Cost(green=1))
+    assert deepcopy(card).definition is card.definition
+
+def test_game_positions_get_card_instances_for_every_card_in_the_deck():
+    new_game = Game()
+    bernardo = Player(name="Bernardo", deck=data.green_land_deck)
+    john = Player(name="John", deck=data.black_land_deck)
+    new_game.add_player(bernardo)
+    new_game.add_player(john)
+
+    new_game.initialize()
+
+    cards = bernardo.position.hand + bernardo.position.library.cards
+    assert len(set(id(card) for card in cards)) == len(data.green_land_deck.cards)
+    assert all(card.definition is data.forest.definition for card in cards)
+    assert all(card.zone == "hand" for card in bernardo.position.hand)
+
+class Watcher(Card):
+    def activate(self):
+        self.game.bus.subscribe('step_started:draw', self.watch)
+
+    def deactivate(self):
+        self.game.bus.unsubscribe('step_started:draw', self.watch)
+
+    def watch(self, game, phase, step):
+        pass
+
+def watcher_game():
+    new_game = Game()
+    deck = Deck("watchers", [Watcher("watcher %d" % cnt, Cost()) for cnt in range(20)])
+    bernardo = Player(name="Bernardo", deck=deck)
+    john = Player(name="John", deck=deepcopy(deck))
+    new_game.add_player(bernardo)
+    new_game.add_player(john)
+    new_game.initialize()
+    return new_game, new_game.positions[new_game.current_position].player
+
+def test_library_cards_are_not_initialized():
+    new_game = Game()
+    bernardo = Player(name="Bernardo", deck=deepcopy(data.green_land_deck))
+    john = Player(name="John", deck=data.black_land_deck)
+    new_game.add_player(bernardo)
+    new_game.add_player(john)
+
+    new_game.initialize()
+
+    assert all(not card.abilities for card in bernardo.position.library.cards)
+    assert all(card.abilities for card in bernardo.position.hand)
+
+def test_cards_in_hand_are_not_activated():
+    new_game, player = watcher_game()
+    assert 'step_started:draw' not in new_game.bus.subscribers
+
+def test_cards_are_activated_when_they_enter_the_battlefield():
+    new_game, player = watcher_game()
+    card = player.position.hand[0]
+    player.play(card)
+
+    assert new_game.bus.subscribers['step_started:draw'] == [card.watch]
+
+def test_cards_are_deactivated_when_they_leave_the_battlefield():
+    new_game, player = watcher_game()
+    card = player.position.hand[0]
+    player.play(card)
+    player.position.move_card(card, "graveyard")
+
+    assert card.zone == "graveyard"
+    assert card in player.position.graveyard
+    assert 'step_started:draw' not in new_game.bus.subscribers
+
+def test_cards_lose_abilities_when_they_go_back_to_the_library():
+    new_game = Game()
+    bernardo = Player(name="Bernardo", deck=deepcopy(data.green_land_deck))
+    john = Player(name="John", deck=data.black_land_deck)
+    new_game.add_player(bernardo)
+    new_game.add_player(john)
+    new_game.initialize()
+
+    card = bernardo.position.hand[0]
+    bernardo.position.move_card(card, "library")
+
+    assert card.zone == "library"
+    assert not card.abilities
+    assert_raises(AttributeError, getattr, card, "GenerateManaAndTap")
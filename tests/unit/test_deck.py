@@ -16,12 +16,13 @@
 # limitations under the License.
 
 import copy
+import random
 
 from formencode.api import Invalid
 
 from tests.unit.utils import *
 from tests.unit.data import *
-from libmagic import Deck
+from libmagic import Deck, Library
 
 def test_create_deck():
     deck = Deck(name="Some Deck", cards=[])
@@ -72,3 +73,64 @@ def test_deck_draw_removes_first_cards_from_deck():
     assert cards[0] == first_cards[0]
     assert cards[1] == first_cards[1]
 
+
+def test_deck_shuffle_uses_given_random_generator():
+    deck_a = Deck(name="a", cards=range(20))
+    deck_b = Deck(name="b", cards=range(20))
+    deck_a.shuffle(random.Random(5))
+    deck_b.shuffle(random.Random(5))
+
+    assert deck_a.cards == deck_b.cards
+
+def shuffled_library(seed, size=100):
+    library = Library(name="library", cards=range(size))
+    library.shuffle(random.Random(seed))
+    return library
+
+def test_library_without_shuffle_keeps_deck_order():
+    library = Library(name="library", cards=range(10))
+
+    assert library.draw(3) == [0, 1, 2]
+    assert library.cards == range(3, 10)
+    assert len(library) == 7
+
+def test_library_shuffle_only_fixes_drawn_cards():
+    library = shuffled_library(1)
+
+    cards = library.draw(7)
+
+    assert len(cards) == 7
+    assert library.top == 7
+    assert len(library) == 93
+
+def test_library_draws_dont_depend_on_looking_at_the_order():
+    library_a = shuffled_library(3)
+    library_b = shuffled_library(3)
+
+    order = list(library_a.cards)
+
+    assert library_a.draw(100) == order
+    assert library_b.draw(100) == order
+    assert sorted(order) == range(100)
+
+def test_library_peek_fixes_only_the_peeked_end():
+    library = shuffled_library(4)
+
+    bottom = library.peek(-1)
+    top = library.peek(0)
+
+    assert library.top == 1
+    assert library.bottom == 99
+    assert library.draw(1) == [top]
+    assert library.cards[-1] == bottom
+    assert_raises(IndexError, library.peek, 99, exc_pattern=r"library index out of range")
+
+def test_library_puts_cards_back_on_top():
+    library = shuffled_library(5)
+    order = list(library.cards)
+
+    cards = library.draw(5)
+    library.put_back(cards)
+
+    assert library.cards == order
+    assert library.draw(2) == order[:2]
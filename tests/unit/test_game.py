@@ -19,7 +19,7 @@ from copy import deepcopy
 
 from formencode.api import Invalid
 
-from libmagic import Game, Player, Deck, Card, Land, FreeForAll, GameMode, InvalidOperationError, Cost
+from libmagic import Game, Player, Deck, Card, Land, FreeForAll, GameMode, InvalidOperationError, Cost, Phase, Step
 from tests.unit.utils import *
 import tests.unit.data as data
 
@@ -594,3 +594,482 @@ def test_passing_through_cleanup_step_clears_mana():
     assert new_game.positions[0].mana["white"] == 0
     assert new_game.positions[0].mana["colorless"] == 0
 
+
+def seeded_game(seed):
+    new_game = Game(seed=seed)
+    deck_a = Deck("deck a", [Card("some card %d" % cnt, Cost(green=cnt)) for cnt in range(20)])
+    deck_b = Deck("deck b", [Card("some card %d" % cnt, Cost(black=cnt)) for cnt in range(20)])
+    new_game.add_player(Player(name="Bernardo", deck=deck_a))
+    new_game.add_player(Player(name="John", deck=deck_b))
+    new_game.initialize()
+    return new_game
+
+def library_names(position):
+    return [card.name for card in position.hand + position.library.cards]
+
+def test_created_game_keeps_seed():
+    new_game = Game(seed=10)
+    assert new_game.seed == 10
+
+def test_games_with_the_same_seed_shuffle_the_same_way():
+    game_a = seeded_game(10)
+    game_b = seeded_game(10)
+
+    assert library_names(game_a.positions[0]) == library_names(game_b.positions[0])
+    assert library_names(game_a.positions[1]) == library_names(game_b.positions[1])
+    assert game_a.current_position == game_b.current_position
+
+def test_games_with_different_seeds_shuffle_independently():
+    game_a = seeded_game(10)
+    game_b = seeded_game(11)
+
+    assert library_names(game_a.positions[0]) != library_names(game_b.positions[0])
+
+def test_game_publishes_steps_on_qualified_topics():
+    global messages
+    messages = []
+    new_game = Game()
+
+    new_game.bus.subscribe('step_started:declare_attackers', on_step_started)
+    new_game.bus.subscribe('phase_started:combat', on_phase_started)
+
+    new_game.add_player(Player(name="Bernardo", deck=deepcopy(data.green_deck)))
+    new_game.add_player(Player(name="John", deck=deepcopy(data.black_deck)))
+    new_game.initialize()
+
+    assert messages == []
+
+    new_game.move_to_next_step()
+
+    assert messages == ['combat_phase_started', 'declare_attackers_step_started']
+
+def test_game_handlers_are_not_subscribed_to_every_step():
+    new_game = Game()
+    new_game.add_player(Player(name="Bernardo", deck=deepcopy(data.green_deck)))
+    new_game.add_player(Player(name="John", deck=deepcopy(data.black_deck)))
+    new_game.initialize()
+
+    assert 'step_started' not in new_game.bus.subscribers
+
+def test_restoring_a_snapshot_brings_back_zones_and_mana():
+    new_game = land_game()
+    player = new_game.positions[new_game.current_position].player
+    hand = list(player.position.hand)
+    library = list(player.position.library.cards)
+
+    snapshot = new_game.snapshot()
+
+    land = player.position.hand[0]
+    player.play(land)
+    land.GenerateManaAndTap()
+
+    new_game.restore(snapshot)
+
+    assert player.position.hand == hand
+    assert player.position.library.cards == library
+    assert not player.position.battlefield
+    assert player.position.mana[land.color] == 0
+    assert land.zone == "hand"
+    assert not land.is_tapped
+
+def test_restoring_a_snapshot_brings_back_turn_phase_and_step():
+    new_game = land_game()
+    snapshot = new_game.snapshot()
+    phase, step, position = new_game.current_phase, new_game.current_step, new_game.current_position
+
+    for i in range(7):
+        new_game.move_to_next_step()
+
+    new_game.restore(snapshot)
+
+    assert new_game.turn == 1
+    assert new_game.current_phase is phase
+    assert new_game.current_step is step
+    assert new_game.current_position == position
+
+def test_restoring_a_snapshot_brings_back_tapped_lands_and_land_drop():
+    new_game = land_game()
+    player = new_game.positions[new_game.current_position].player
+    land = player.position.hand[0]
+    player.play(land)
+    land.GenerateManaAndTap()
+
+    snapshot = new_game.snapshot()
+
+    new_game.move_to_next_step()
+    new_game.move_to_next_step()
+    new_game.move_to_next_step()
+    new_game.move_to_next_step()
+    new_game.move_to_next_step()
+
+    new_game.restore(snapshot)
+
+    assert land.is_tapped
+    assert player.position.battlefield == [land]
+    assert_raises(InvalidOperationError, player.play, card=player.position.hand[0], exc_pattern=r"The player can only play one land per turn.")
+
+def test_land_drops_are_kept_per_game():
+    first_game = land_game()
+    second_game = land_game()
+    first_player = first_game.positions[first_game.current_position].player
+    second_player = second_game.positions[second_game.current_position].player
+
+    first_player.play(first_player.position.hand[0])
+    second_player.play(second_player.position.hand[0])
+
+    assert first_player.position.turn_state.has_played_land
+    assert second_player.position.turn_state.has_played_land
+    assert not first_game.positions[1].turn_state.has_played_land
+    assert_raises(InvalidOperationError, first_player.play, card=first_player.position.hand[0], exc_pattern=r"The player can only play one land per turn.")
+
+def test_upkeep_resets_turn_state_and_hash():
+    new_game = land_game()
+    position = new_game.positions[new_game.current_position]
+    position.player.play(position.hand[0])
+
+    while new_game.current_position == position.index or new_game.current_step.name != "main":
+        new_game.move_to_next_step()
+    assert position.turn_state.has_played_land
+    while new_game.current_position != position.index or new_game.current_step.name != "main":
+        new_game.move_to_next_step()
+
+    assert not position.turn_state.has_played_land
+    assert new_game.hash == new_game.compute_hash()
+    position.player.play(position.hand[0])
+
+def test_restoring_a_snapshot_brings_back_hit_points_and_winner():
+    new_game = land_game()
+    snapshot = new_game.snapshot()
+
+    new_game.game_mode.set_hit_points_for("John", 0)
+    new_game.restore(snapshot)
+
+    assert new_game.positions[1].hit_points == 20
+    assert new_game.winner is None
+    assert not new_game.end_date
+
+def test_restoring_a_snapshot_reattaches_abilities_of_cards_drawn_back():
+    new_game = land_game()
+    player = new_game.positions[new_game.current_position].player
+    card = player.position.library.cards[0]
+    player.position.move_card(card, "battlefield")
+    snapshot = new_game.snapshot()
+    player.position.move_card(card, "library")
+
+    new_game.restore(snapshot)
+
+    assert card.zone == "battlefield"
+    card.GenerateManaAndTap()
+    assert card.is_tapped
+
+def test_checkpoint_raises_when_game_is_not_journaled():
+    new_game = land_game()
+    assert_raises(InvalidOperationError, new_game.checkpoint, exc_pattern=r"The game must be created with journal=True")
+
+def test_journaled_game_starts_with_empty_journal():
+    new_game = land_game(journal=True)
+    assert new_game.journal == []
+
+def test_rollback_undoes_play_and_mana_generation():
+    new_game = land_game(journal=True)
+    player = new_game.positions[new_game.current_position].player
+    hand = list(player.position.hand)
+    checkpoint = new_game.checkpoint()
+
+    land = player.position.hand[3]
+    player.play(land)
+    land.GenerateManaAndTap()
+
+    new_game.rollback(checkpoint)
+
+    assert player.position.hand == hand
+    assert not player.position.battlefield
+    assert player.position.mana[land.color] == 0
+    assert not land.is_tapped
+    assert land.zone == "hand"
+    player.play(land)
+
+def test_rollback_undoes_steps_cleanup_and_draws():
+    new_game = land_game(journal=True)
+    player = new_game.positions[new_game.current_position].player
+    land = player.position.hand[0]
+    player.play(land)
+    land.GenerateManaAndTap()
+    library = list(player.position.library.cards)
+    hand = list(player.position.hand)
+    phase, step = new_game.current_phase, new_game.current_step
+
+    checkpoint = new_game.checkpoint()
+
+    for i in range(10):
+        new_game.move_to_next_step()
+    player.position.draw(2)
+
+    assert new_game.turn == 2
+    new_game.rollback(checkpoint)
+
+    assert new_game.turn == 1
+    assert new_game.current_phase is phase
+    assert new_game.current_step is step
+    assert player.position.mana[land.color] == 1
+    assert land.is_tapped
+    assert player.position.library.cards == library
+    assert player.position.hand == hand
+    assert_raises(InvalidOperationError, player.play, card=hand[0], exc_pattern=r"The player can only play one land per turn.")
+
+def test_rollback_undoes_hit_point_changes():
+    new_game = land_game(journal=True)
+    checkpoint = new_game.checkpoint()
+
+    new_game.game_mode.set_hit_points_for("John", 0)
+    new_game.rollback(checkpoint)
+
+    assert new_game.positions[1].hit_points == 20
+    assert new_game.winner is None
+    assert not new_game.end_date
+
+def test_rollback_can_be_nested():
+    new_game = land_game(journal=True)
+    player = new_game.positions[new_game.current_position].player
+    land = player.position.hand[0]
+
+    first = new_game.checkpoint()
+    player.play(land)
+    second = new_game.checkpoint()
+    land.GenerateManaAndTap()
+
+    new_game.rollback(second)
+    assert land.zone == "battlefield"
+    assert not land.is_tapped
+
+    new_game.rollback(first)
+    assert land.zone == "hand"
+
+def play_some_turns(new_game):
+    for turn in range(3):
+        player = new_game.positions[new_game.current_position].player
+        land = player.position.hand[0]
+        player.play(land)
+        for card in player.position.battlefield:
+            if not card.is_tapped:
+                card.GenerateManaAndTap()
+        for i in range(5):
+            new_game.move_to_next_step()
+
+def test_initialized_game_has_state_hash():
+    new_game = land_game()
+    assert new_game.hash
+    assert new_game.hash == new_game.compute_hash()
+
+def test_state_hash_is_kept_up_to_date_incrementally():
+    new_game = land_game()
+    play_some_turns(new_game)
+    new_game.game_mode.set_hit_points_for("John", 15)
+    new_game.positions[0].draw(1)
+
+    assert new_game.hash == new_game.compute_hash()
+
+def test_state_hash_is_the_same_for_games_with_the_same_seed():
+    game_a = land_game()
+    play_some_turns(game_a)
+    game_b = land_game()
+    play_some_turns(game_b)
+
+    assert game_a.hash == game_b.hash
+
+def test_state_hash_changes_when_state_changes():
+    new_game = land_game()
+    before = new_game.hash
+    player = new_game.positions[new_game.current_position].player
+    land = player.position.hand[0]
+    player.play(land)
+    played = new_game.hash
+    land.GenerateManaAndTap()
+
+    assert len(set([before, played, new_game.hash])) == 3
+
+def test_state_hash_comes_back_with_snapshots_and_rollbacks():
+    new_game = land_game(journal=True)
+    snapshot = new_game.snapshot()
+    checkpoint = new_game.checkpoint()
+    before = new_game.hash
+
+    play_some_turns(new_game)
+    new_game.rollback(checkpoint)
+    assert new_game.hash == before == new_game.compute_hash()
+
+    play_some_turns(new_game)
+    new_game.restore(snapshot)
+    assert new_game.hash == before == new_game.compute_hash()
+
+def test_state_hash_follows_direct_tapped_state_writes():
+    new_game = land_game(journal=True)
+    player = new_game.positions[new_game.current_position].player
+    land = player.position.hand[0]
+    player.play(land)
+    checkpoint = new_game.checkpoint()
+
+    land.is_tapped = True
+    assert new_game.hash == new_game.compute_hash()
+    assert land in player.position.battlefield.select(tapped=True)
+
+    new_game.rollback(checkpoint)
+    assert not land.is_tapped
+    assert new_game.hash == new_game.compute_hash()
+
+def test_mana_pool_writes_keep_the_state_hash_and_journal():
+    new_game = land_game(journal=True)
+    position = new_game.positions[new_game.current_position]
+    checkpoint = new_game.checkpoint()
+
+    position.mana["green"] = 3
+    assert position.mana["green"] == 3
+    assert new_game.hash == new_game.compute_hash()
+
+    new_game.rollback(checkpoint)
+    assert position.mana["green"] == 0
+    assert new_game.hash == new_game.compute_hash()
+
+    position.mana["green"] = 3
+    position.clear_mana()
+    assert new_game.hash == new_game.compute_hash()
+
+def test_mana_pool_writes_refresh_castable_cards():
+    new_game = seeded_game(1)
+    position = new_game.positions[0]
+    free_cards = set([card for card in position.hand if not card.cost.green])
+
+    position.mana["green"] = 20
+    assert position.castable == set(position.hand)
+
+    position.mana["green"] = 0
+    assert position.castable == free_cards
+
+def test_rolling_back_past_a_restored_snapshot():
+    new_game = land_game(journal=True)
+    position = new_game.positions[new_game.current_position]
+    checkpoint = new_game.checkpoint()
+    hand = list(position.hand)
+    position.draw(1)
+    snapshot = new_game.snapshot()
+    position.draw(1)
+    new_game.restore(snapshot)
+    position.player.play(position.hand[0])
+
+    new_game.rollback(checkpoint)
+
+    assert list(position.hand) == hand
+    assert not position.battlefield
+    assert new_game.hash == new_game.compute_hash()
+
+def test_rolling_back_undoes_a_restore():
+    new_game = land_game(journal=True)
+    position = new_game.positions[new_game.current_position]
+    checkpoint = new_game.checkpoint()
+    snapshot = new_game.snapshot()
+    position.draw(1)
+    drawn = new_game.checkpoint()
+    hand = list(position.hand)
+
+    new_game.restore(snapshot)
+    new_game.rollback(drawn)
+    assert list(position.hand) == hand
+    assert new_game.hash == new_game.compute_hash()
+
+    new_game.rollback(checkpoint)
+    assert len(position.hand) == 7
+    assert new_game.hash == new_game.compute_hash()
+
+def test_game_compiles_phases_into_transitions():
+    new_game = Game()
+    steps = [step for phase in new_game.phases for step in phase.steps]
+
+    assert [transition[1] for transition in new_game.transitions] == steps
+    assert new_game.step_index is None
+
+def test_game_moves_through_steps_repeated_in_a_phase():
+    global messages
+    messages = []
+    repeated = Step("repeated")
+    new_game = Game(phases=[Phase("beggining", [Step("upkeep", automatic=True)]), Phase("loop", [repeated, repeated, Step("end")])])
+    new_game.bus.subscribe('step_started', on_step_started)
+    new_game.add_player(Player(name="Bernardo", deck=deepcopy(data.green_deck)))
+    new_game.add_player(Player(name="John", deck=deepcopy(data.black_deck)))
+    new_game.initialize()
+
+    new_game.move_to_next_step()
+    new_game.move_to_next_step()
+
+    assert messages == ['upkeep_step_started', 'repeated_step_started', 'repeated_step_started', 'end_step_started']
+    assert new_game.step_index == 3
+
+def test_game_moves_through_long_automatic_chains_without_recursion():
+    automatic_steps = [Step("auto %d" % number, automatic=True) for number in range(5000)]
+    new_game = Game(phases=[Phase("automatic", automatic_steps), Phase("main", [Step("main")])])
+    new_game.add_player(Player(name="Bernardo", deck=deepcopy(data.green_deck)))
+    new_game.add_player(Player(name="John", deck=deepcopy(data.black_deck)))
+    new_game.initialize()
+
+    assert new_game.current_step.name == "main"
+    new_game.move_to_next_step()
+
+    assert new_game.current_step.name == "main"
+    assert new_game.turn == 1
+
+class Attacker(Card):
+    def acts_during(self, game, phase, step):
+        return phase.name == "combat"
+
+def test_advancing_to_next_decision_skips_combat_without_creatures():
+    global messages
+    messages = []
+    new_game = land_game()
+    new_game.bus.subscribe('step_started', on_step_started)
+    position = new_game.current_position
+
+    new_game.advance_to_next_decision()
+
+    assert new_game.current_step.name == "main"
+    assert new_game.step_index == 9
+    assert new_game.current_position == position
+    assert messages == ['beggining_step_started', 'declare_attackers_step_started', 'declare_blockers_step_started',
+                        'damage_step_started', 'end_step_started', 'main_step_started']
+
+def test_advancing_to_next_decision_stops_at_steps_with_topic_subscribers():
+    global messages
+    messages = []
+    new_game = land_game()
+    new_game.bus.subscribe('step_started:declare_blockers', on_step_started)
+
+    new_game.advance_to_next_decision()
+
+    assert new_game.current_step.name == "declare_blockers"
+    assert messages == ['declare_blockers_step_started']
+
+def test_advancing_to_next_decision_stops_where_cards_on_the_battlefield_act():
+    new_game = land_game()
+    position = new_game.positions[new_game.current_position]
+    attacker = Attacker("attacker", Cost()).instantiate(new_game, position, 99)
+    position.battlefield.append(attacker)
+
+    new_game.advance_to_next_decision()
+
+    assert new_game.current_step.name == "declare_attackers"
+
+def test_advancing_to_next_decision_goes_through_the_other_players_turn():
+    new_game = land_game()
+    position = new_game.current_position
+
+    new_game.advance_to_next_decision()
+    new_game.advance_to_next_decision()
+
+    assert new_game.current_step.name == "main"
+    assert new_game.current_position != position
+    assert new_game.hash == new_game.compute_hash()
+
+def test_initialize_does_not_shuffle_the_whole_library():
+    new_game = land_game()
+
+    for position in new_game.positions:
+        assert position.library.top == position.library.cursor == 7
+        assert position.library.bottom < 20
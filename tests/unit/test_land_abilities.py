@@ -112,3 +112,34 @@ def test_generate_mana_and_tap_ability_publishes_mana_generated_event():
     assert len(messages) == 1
     assert messages[0] == "Card Forest tapped to generate 1 green mana"
 
+
+def test_ability_classes_know_their_name():
+    assert GenerateManaAndTapAbility.ability_name == "GenerateManaAndTap"
+
+def test_initialized_land_registers_ability_in_dispatch_table():
+    land = Card("some card", Cost(), ability_types=(GenerateManaAndTapAbility,)).instantiate(None, None)
+    land.initialize(None, None)
+
+    assert land.ability_table["GenerateManaAndTap"] == land.abilities[0].execute
+    assert land.GenerateManaAndTap == land.abilities[0].execute
+
+def test_calling_missing_ability_raises_attribute_error():
+    land = Card("some card", Cost(), ability_types=(GenerateManaAndTapAbility,)).instantiate(None, None)
+    land.initialize(None, None)
+
+    try:
+        land.Fly()
+    except AttributeError, err:
+        assert str(err) == "Fly"
+        return
+
+    assert False, "Should not have gone this far"
+
+def test_first_ability_with_a_name_wins():
+    land = Card("some card", Cost(), ability_types=(GenerateManaAndTapAbility,)).instantiate(None, None)
+    land.initialize(None, None)
+    first = land.GenerateManaAndTap
+
+    land.add_ability(GenerateManaAndTapAbility(land))
+
+    assert land.GenerateManaAndTap == first
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+# Copyright Bernardo Heynemann <heynemann@gmail.com>
+
+# Licensed under the Open Software License ("OSL") v. 3.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.opensource.org/licenses/osl-3.0.php
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from tests.unit.utils import *
+from libmagic import MetricsRegistry, InvalidOperationError
+from libmagic.metrics import Counter, Histogram
+
+def test_invalid_operation_error_keeps_reason():
+    error = InvalidOperationError("some message", reason="some_reason")
+
+    assert str(error) == "some message"
+    assert error.reason == "some_reason"
+    assert InvalidOperationError("some message").reason is None
+
+def test_counter_renders_labeled_values():
+    counter = Counter("some_total", "Some help.", label="reason", labels=("a", "b"))
+    counter.inc(slot=1)
+    counter.inc(2, slot=1)
+
+    assert counter.value("b") == 3
+    assert counter.render() == ["# HELP some_total Some help.",
+                                "# TYPE some_total counter",
+                                'some_total{reason="a"} 0',
+                                'some_total{reason="b"} 3']
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("some", "Some help.", buckets=(1, 5))
+    for value in (1, 3, 7):
+        histogram.observe(value)
+
+    assert histogram.render() == ["# HELP some Some help.",
+                                  "# TYPE some histogram",
+                                  'some_bucket{le="1"} 1',
+                                  'some_bucket{le="5"} 2',
+                                  'some_bucket{le="+Inf"} 3',
+                                  "some_sum 11",
+                                  "some_count 3"]
+
+def test_unwatched_games_have_no_metrics_subscribers():
+    registry = MetricsRegistry()
+    new_game = land_game(watchers=[registry])
+    registry.unwatch(new_game)
+
+    for message, func in registry.subscriptions:
+        assert func not in new_game.bus.subscribers.get(message, [])
+
+def test_registry_counts_game_events():
+    registry = MetricsRegistry()
+    new_game = land_game(watchers=[registry])
+    player = new_game.positions[new_game.current_position].player
+    other_player = new_game.positions[1 - new_game.current_position].player
+
+    assert registry.games_started.value() == 1
+    steps = registry.steps.value()
+    assert steps > 0
+
+    land = player.position.hand[0]
+    player.play(land)
+    land.GenerateManaAndTap()
+    assert_raises(InvalidOperationError, player.play, player.position.hand[0])
+    assert_raises(InvalidOperationError, player.play, land)
+    assert_raises(InvalidOperationError, other_player.play, other_player.position.hand[0])
+
+    new_game.move_to_next_step()
+    new_game.game_mode.set_hit_points_for(other_player.name, 0)
+
+    assert registry.plays.value() == 1
+    assert registry.mana_taps.value() == 1
+    assert registry.steps.value() > steps
+    assert registry.rejected_plays.value("invalid_play") == 1
+    assert registry.rejected_plays.value("not_in_hand") == 1
+    assert registry.rejected_plays.value("not_your_turn") == 1
+    assert registry.games_finished.value() == 1
+    assert registry.turns.count == 1
+
+def test_registry_renders_prometheus_text():
+    registry = MetricsRegistry()
+    land_game(watchers=[registry])
+
+    text = registry.render()
+
+    assert "# TYPE libmagic_games_started_total counter\nlibmagic_games_started_total 1\n" in text
+    assert 'libmagic_rejected_plays_total{reason="other"} 0\n' in text
+    assert "# TYPE libmagic_game_turns histogram\n" in text
+    assert text.endswith("\n")
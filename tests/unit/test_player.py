@@ -21,7 +21,7 @@ from formencode.api import Invalid
 
 from tests.unit.utils import *
 import tests.unit.data as data
-from libmagic import Game, Player, Cost, Deck, Card, Land, GameNotInitializedError, InvalidOperationError
+from libmagic import Game, Player, Cost, Deck, Card, Land, ManaPool, GameNotInitializedError, InvalidOperationError
 
 def test_can_create_player():
     new_player = Player(name="Bernardo", deck=deepcopy(data.green_deck))
@@ -216,3 +216,232 @@ def test_cost_validates_cost_for_colorless_even_when_many_color_manas_available(
 def test_cost_validates_cost_for_colorless_satisfied_by_other_manas():
     assert Cost(colorless=6).is_satisfied_by(red=3, white=2, colorless=1)
 
+
+def test_cost_keeps_amounts_in_mana_color_order():
+    assert Cost(green=1, red=2, black=3, white=4, blue=5, colorless=6).amounts == (1, 2, 3, 4, 5, 6)
+
+def test_cost_validates_pool_for_colorless_satisfied_by_other_manas():
+    assert Cost(colorless=6).is_satisfied_by_pool((0, 3, 0, 2, 0, 1))
+    assert not Cost(colorless=6).is_satisfied_by_pool((1, 1, 1, 1, 1, 0))
+
+def test_cost_pool_checks_match_keyword_checks():
+    import random
+    generator = random.Random(42)
+    colors = ("green", "red", "black", "white", "blue", "colorless")
+    costs = [Cost(**dict(zip(colors, [generator.randint(0, 2) for color in colors]))) for cnt in range(50)]
+
+    for attempt in range(200):
+        pool = [generator.randint(0, 3) for color in colors]
+        expected = [cost.is_satisfied_by(**dict(zip(colors, pool))) for cost in costs]
+
+        assert [cost.is_satisfied_by_pool(pool) for cost in costs] == expected
+        assert Cost.are_satisfied_by_pool(costs, pool) == expected
+
+def castable_game():
+    new_game = Game(seed=3)
+    cards = [Land("Forest", "green") for cnt in range(10)] + [Card("Bear %d" % cnt, Cost(green=1)) for cnt in range(10)]
+    bernardo = Player(name="Bernardo", deck=Deck("bears", cards))
+    john = Player(name="John", deck=Deck("bears", list(cards)))
+    new_game.add_player(bernardo)
+    new_game.add_player(john)
+    new_game.initialize()
+    return new_game, new_game.positions[new_game.current_position].player
+
+def expected_castable(player):
+    castable = set()
+    for card in player.position.hand:
+        if card.validate_play(player.game, player.position)[0] and card.cost.is_satisfied_by(**player.position.mana):
+            castable.add(card)
+    return castable
+
+def test_castable_cards_start_as_the_lands_in_hand():
+    new_game, player = castable_game()
+    assert player.position.castable == set(card for card in player.position.hand if isinstance(card, Land))
+
+def test_castable_cards_follow_plays_mana_and_steps():
+    new_game, player = castable_game()
+    lands = [card for card in player.position.hand if isinstance(card, Land)]
+    player.play(lands[0])
+    assert player.position.castable == expected_castable(player)
+    assert not [card for card in player.position.castable if isinstance(card, Land)]
+
+    lands[0].GenerateManaAndTap()
+    assert player.position.castable == expected_castable(player)
+
+    for i in range(5):
+        new_game.move_to_next_step()
+    assert player.position.castable == expected_castable(player)
+    assert not player.position.mana["green"]
+
+    for i in range(5):
+        new_game.move_to_next_step()
+    assert player.position.castable == expected_castable(player)
+    assert [card for card in player.position.castable if isinstance(card, Land)]
+
+def test_castable_cards_follow_draws():
+    new_game, player = castable_game()
+    player.position.draw(5)
+    assert player.position.castable == expected_castable(player)
+
+def test_castable_cards_follow_mana_payments():
+    new_game, player = castable_game()
+    player.position.add_mana("green", 3)
+    player.position.refresh_castable()
+    assert [card for card in player.position.castable if not isinstance(card, Land)]
+
+    player.position.pay_mana(Cost(colorless=3))
+
+    assert player.position.castable == expected_castable(player)
+    assert not [card for card in player.position.castable if not isinstance(card, Land)]
+
+def test_castable_cards_are_recomputed_on_restore():
+    new_game, player = castable_game()
+    snapshot = new_game.snapshot()
+    castable = set(player.position.castable)
+    land = list(castable)[0]
+    player.play(land)
+
+    new_game.restore(snapshot)
+
+    assert player.position.castable == castable
+
+def payment_game(colors, spell_cost):
+    new_game = Game(seed=5)
+    cards = [Land("Land %d" % cnt, color) for cnt, color in enumerate(colors)] + \
+            [Card("Spell %d" % cnt, spell_cost) for cnt in range(20)]
+    bernardo = Player(name="Bernardo", deck=Deck("lands", cards))
+    john = Player(name="John", deck=Deck("lands", list(cards)))
+    new_game.add_player(bernardo)
+    new_game.add_player(john)
+    new_game.initialize()
+
+    player = new_game.positions[new_game.current_position].player
+    for card in player.position.library.cards + player.position.hand:
+        if isinstance(card, Land):
+            player.position.move_card(card, "battlefield")
+    return new_game, player
+
+def test_plan_payment_keeps_demanded_colors_in_reserve():
+    new_game, player = payment_game(["green", "green", "red"], Cost(red=1))
+
+    plan = player.position.plan_payment(Cost(green=1, colorless=1))
+
+    assert [card.color for card in plan] == ["green", "green"]
+
+def test_plan_payment_prefers_colorless_sources_for_generic_costs():
+    new_game, player = payment_game(["green", "colorless"], Cost(green=1))
+
+    plan = player.position.plan_payment(Cost(colorless=1))
+
+    assert [card.color for card in plan] == ["colorless"]
+
+def test_plan_payment_returns_none_when_cost_cant_be_paid():
+    new_game, player = payment_game(["green", "green"], Cost(green=1))
+
+    assert player.position.plan_payment(Cost(blue=1)) is None
+    assert player.position.plan_payment(Cost(colorless=3)) is None
+
+def test_plan_payment_skips_tapped_sources_and_uses_floating_mana():
+    new_game, player = payment_game(["green", "green", "red"], Cost(green=1))
+    player.position.battlefield[0].GenerateManaAndTap()
+
+    assert player.position.plan_payment(Cost(green=1)) == []
+
+    plan = player.position.plan_payment(Cost(green=2))
+    assert len(plan) == 1
+    assert plan[0].color == "green"
+    assert not plan[0].is_tapped
+
+def test_plan_payment_is_minimal_with_many_lands():
+    colors = ["green", "red", "black", "white", "blue", "colorless"] * 4
+    new_game, player = payment_game(colors, Cost(blue=1))
+
+    plan = player.position.plan_payment(Cost(green=3, red=3, black=2, colorless=8))
+
+    assert len(plan) == 16
+    assert len(set(plan)) == 16
+    plan_colors = [card.color for card in plan]
+    assert plan_colors.count("green") >= 3
+    assert plan_colors.count("red") >= 3
+    assert plan_colors.count("black") >= 2
+    assert plan_colors.count("colorless") == 4
+    assert plan_colors.count("blue") == 0
+
+def test_player_play_with_auto_pay_taps_the_planned_lands():
+    new_game, player = payment_game(["green", "green", "green"], Cost(green=2))
+    spell = player.position.hand[0]
+
+    player.play(spell, auto_pay=True)
+
+    assert spell in player.position.battlefield
+    assert len([card for card in player.position.battlefield if card.is_tapped]) == 2
+    assert player.position.mana["green"] == 0
+
+def test_player_play_with_auto_pay_spends_the_mana():
+    new_game, player = payment_game(["green", "green", "green"], Cost(green=2))
+    spells = [card for card in player.position.hand if not isinstance(card, Land)]
+
+    player.play(spells[0], auto_pay=True)
+
+    assert_raises(InvalidOperationError, player.play, card=spells[1], auto_pay=True, exc_pattern=r"The card cost must be satisfied in order for it to be played.")
+    assert spells[1] in player.position.hand
+    assert len([card for card in player.position.battlefield if card.is_tapped]) == 2
+    assert player.position.mana["green"] == 0
+    assert new_game.hash == new_game.compute_hash()
+
+def test_player_play_with_auto_pay_raises_without_tapping_when_cost_cant_be_paid():
+    new_game, player = payment_game(["green"], Cost(green=2))
+    spell = player.position.hand[0]
+
+    assert_raises(InvalidOperationError, player.play, card=spell, auto_pay=True, exc_pattern=r"The card cost must be satisfied in order for it to be played.")
+    assert not [card for card in player.position.battlefield if card.is_tapped]
+
+def test_mana_pool_reads_and_writes_colors_by_name():
+    pool = ManaPool()
+    pool["red"] = 2
+    pool.add(0)
+
+    assert pool["green"] == 1
+    assert pool["red"] == 2
+    assert pool.amounts == [1, 2, 0, 0, 0, 0]
+    assert dict(**pool) == {"green":1, "red":2, "black":0, "white":0, "blue":0, "colorless":0}
+
+def test_mana_pool_resets_in_place():
+    pool = ManaPool([1, 2, 3, 4, 5, 6])
+    amounts = pool.amounts
+
+    pool.reset()
+
+    assert pool.amounts is amounts
+    assert pool.amounts == [0] * 6
+
+def test_mana_pool_pays_colorless_with_colorless_then_most_plentiful_colors():
+    pool = ManaPool([3, 1, 0, 0, 2, 1])
+
+    assert pool.can_pay(Cost(green=1, colorless=3))
+    pool.pay(Cost(green=1, colorless=3))
+
+    assert pool.amounts == [1, 1, 0, 0, 1, 0]
+
+def test_mana_pool_raises_when_paying_more_than_it_has():
+    pool = ManaPool([1, 0, 0, 0, 0, 0])
+
+    assert not pool.can_pay(Cost(red=1))
+    assert_raises(InvalidOperationError, pool.pay, Cost(red=1), exc_pattern=r"The mana pool can't pay this cost.")
+    assert pool.amounts == [1, 0, 0, 0, 0, 0]
+
+def test_position_pays_mana_with_journal_and_hash():
+    new_game = land_game(journal=True)
+    position = new_game.positions[new_game.current_position]
+    position.add_mana("green", 2)
+    checkpoint = new_game.checkpoint()
+
+    position.pay_mana(Cost(colorless=1))
+
+    assert position.mana["green"] == 1
+    assert new_game.hash == new_game.compute_hash()
+
+    new_game.rollback(checkpoint)
+
+    assert position.mana["green"] == 2
+    assert new_game.hash == new_game.compute_hash()
@@ -0,0 +1,294 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+# Copyright Bernardo Heynemann <heynemann@gmail.com>
+
+# Licensed under the Open Software License ("OSL") v. 3.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.opensource.org/licenses/osl-3.0.php
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import shutil
+import tempfile
+from StringIO import StringIO
+
+from tests.unit.utils import *
+from libmagic import InvalidOperationError
+from libmagic.recording import Recorder, LogReader, read_log, MAGIC, INDEX_MAGIC
+
+class KeptOpenStream(StringIO):
+    def close(self):
+        pass
+
+def play_a_land(new_game):
+    position = new_game.positions[new_game.current_position]
+    land = position.hand[0]
+    position.player.play(land)
+    land.GenerateManaAndTap()
+    return position, land
+
+def records_of(stream):
+    return list(read_log(StringIO(stream.getvalue())))
+
+def test_recorder_writes_game_setup_with_interned_definitions():
+    stream = KeptOpenStream()
+    recorder = Recorder(stream)
+    new_game = land_game(watchers=[recorder])
+    recorder.close()
+
+    kind, setup = records_of(stream)[0]
+
+    assert stream.getvalue().startswith(MAGIC)
+    assert kind == "game"
+    assert setup["seed"] == 1
+    assert setup["hash"] == new_game.compute_hash()
+    assert [player["name"] for player in setup["players"]] == ["Bernardo", "John"]
+    assert len(setup["players"][0]["cards"]) == 20
+    assert setup["players"][0]["cards"][0] == {"type": "Land", "name": "Forest", "color": "green",
+                                               "cost": [0, 0, 0, 0, 0, 0],
+                                               "abilities": ["GenerateManaAndTapAbility"]}
+    assert sorted(recorder.definition_ids.values()) == [0, 1]
+
+def test_recorder_writes_compact_events_with_game_point_and_hash():
+    stream = KeptOpenStream()
+    recorder = Recorder(stream)
+    new_game = land_game(watchers=[recorder])
+    position, land = play_a_land(new_game)
+    new_game.move_to_next_step()
+    recorder.close()
+
+    events = [record for kind, record in records_of(stream) if kind == "event"]
+
+    assert [event.message for event in events] == ["card_played", "mana_generated", "recording_stopped"]
+    assert [event.position for event in events] == [position.index, position.index, None]
+    assert events[0].subject == land.index
+    assert events[0].turn == 1
+    assert events[0].step_index == 3
+    assert events[-1].step_index == new_game.step_index
+    assert events[-1].hash == new_game.hash
+
+def test_recorder_records_winner_of_finished_games():
+    stream = KeptOpenStream()
+    recorder = Recorder(stream)
+    new_game = land_game(watchers=[recorder])
+    new_game.game_mode.set_hit_points_for("John", 0)
+    recorder.close()
+
+    event = records_of(stream)[-1][1]
+
+    assert event.message == "game_finished"
+    assert event.position == 0
+
+def test_recorder_records_hit_point_changes():
+    stream = KeptOpenStream()
+    recorder = Recorder(stream)
+    new_game = land_game(watchers=[recorder])
+    new_game.game_mode.set_hit_points_for("Bernardo", 17)
+    new_game.game_mode.set_hit_points_for("John", -3)
+    recorder.close()
+
+    events = [record for kind, record in records_of(stream) if kind == "event"]
+
+    assert [event.message for event in events] == ["hit_points_changed", "hit_points_changed", "game_finished"]
+    assert [(event.position, event.subject) for event in events[:2]] == [(0, 17), (1, -3)]
+    assert events[1].hash == new_game.hash
+
+def test_recorder_records_draws_and_zone_moves():
+    stream = KeptOpenStream()
+    recorder = Recorder(stream)
+    new_game = land_game(watchers=[recorder])
+    position = new_game.positions[new_game.current_position]
+    position.draw(2)
+    card = position.hand[0]
+    position.move_card(card, "graveyard")
+    recorder.close()
+
+    events = [record for kind, record in records_of(stream) if kind == "event"]
+
+    assert [event.message for event in events] == ["cards_drawn", "card_moved:graveyard", "recording_stopped"]
+    assert (events[0].position, events[0].subject) == (position.index, 2)
+    assert (events[1].position, events[1].subject) == (position.index, card.index)
+    assert events[1].hash == new_game.hash
+
+def test_recorder_records_many_games_writing_definitions_once():
+    stream = KeptOpenStream()
+    recorder = Recorder(stream)
+    land_game(watchers=[recorder])
+    single_game_size = len(stream.getvalue()) + len(recorder.buffer)
+    land_game(watchers=[recorder])
+    recorder.stop()
+    two_games_size = len(stream.getvalue()) + len(recorder.buffer)
+    recorder.close()
+
+    records = records_of(stream)
+
+    assert [kind for kind, record in records] == ["game", "event", "game", "event"]
+    assert two_games_size < 2 * single_game_size
+
+def test_recorder_buffers_writes():
+    stream = KeptOpenStream()
+    recorder = Recorder(stream, buffer_size=64)
+    new_game = land_game(watchers=[recorder])
+
+    assert stream.getvalue() == ""
+
+    for turn in range(4):
+        play_a_land(new_game)
+        for step in range(10):
+            new_game.move_to_next_step()
+
+    assert len(stream.getvalue()) > 0
+
+def test_read_log_rejects_other_files():
+    assert_raises(ValueError, list, read_log(StringIO("not a log")), exc_pattern=r"Not a libmagic game log.")
+
+def play_until_turn(new_game, turn):
+    while new_game.turn < turn:
+        if new_game.current_step.name == "main" and new_game.positions[new_game.current_position].hand:
+            try:
+                play_a_land(new_game)
+            except InvalidOperationError:
+                pass
+        new_game.move_to_next_step()
+
+def test_recorder_writes_compressed_keyframes_every_few_turns():
+    stream = KeptOpenStream()
+    recorder = Recorder(stream, keyframe_interval=2)
+    new_game = land_game(watchers=[recorder])
+    play_until_turn(new_game, 6)
+    recorder.close()
+
+    records = records_of(stream)
+    keyframes = [record for kind, record in records if kind == "keyframe"]
+    events_before = [kind for kind, record in records[:records.index(("keyframe", keyframes[-1]))]].count("event")
+    state = keyframes[-1].state
+
+    assert [keyframe.turn for keyframe in keyframes] == [3, 5]
+    assert keyframes[-1].event == events_before
+    assert (state["turn"], state["current_position"], state["step_index"]) == (5, 0, 0)
+    assert len(state["positions"]) == 2
+    assert len(state["positions"][0]["battlefield"]) == len(state["positions"][0]["tapped"])
+    assert len(state["positions"][0]["library"]) == 20
+
+def test_recorder_without_keyframe_interval_writes_no_keyframes():
+    stream = KeptOpenStream()
+    recorder = Recorder(stream, keyframe_interval=None)
+    new_game = land_game(watchers=[recorder])
+    play_until_turn(new_game, 6)
+    recorder.close()
+
+    assert "keyframe" not in [kind for kind, record in records_of(stream)]
+
+def test_recorder_drops_rolled_back_moves():
+    stream = KeptOpenStream()
+    recorder = Recorder(stream)
+    new_game = land_game(journal=True, watchers=[recorder])
+    position = new_game.positions[new_game.current_position]
+    checkpoint = new_game.checkpoint()
+    play_a_land(new_game)
+    new_game.rollback(checkpoint)
+
+    land = position.hand[1]
+    position.player.play(land)
+    recorder.close()
+
+    events = [record for kind, record in records_of(stream) if kind == "event"]
+
+    assert [event.message for event in events] == ["card_played", "recording_stopped"]
+    assert events[0].subject == land.index
+    assert events[-1].hash == new_game.hash
+
+def test_recorder_drops_keyframes_of_rolled_back_turns():
+    stream = KeptOpenStream()
+    recorder = Recorder(stream, keyframe_interval=2)
+    new_game = land_game(journal=True, watchers=[recorder])
+    checkpoint = new_game.checkpoint()
+    play_until_turn(new_game, 6)
+    new_game.rollback(checkpoint)
+    play_until_turn(new_game, 4)
+    recorder.close()
+
+    records = records_of(stream)
+    keyframes = [record for kind, record in records if kind == "keyframe"]
+    events_before = [kind for kind, record in records[:records.index(("keyframe", keyframes[-1]))]].count("event")
+
+    assert [keyframe.turn for keyframe in keyframes] == [3]
+    assert keyframes[-1].event == events_before
+
+def test_recorder_cant_drop_rolled_back_moves_it_already_flushed():
+    recorder = Recorder(KeptOpenStream())
+    new_game = land_game(journal=True, watchers=[recorder])
+    checkpoint = new_game.checkpoint()
+    play_a_land(new_game)
+    recorder.flush()
+
+    assert_raises(InvalidOperationError, new_game.rollback, checkpoint, exc_pattern=r"already flushed")
+
+def test_recorder_ends_the_log_with_an_index():
+    stream = KeptOpenStream()
+    recorder = Recorder(stream, keyframe_interval=2)
+    play_until_turn(land_game(watchers=[recorder]), 4)
+    play_until_turn(land_game(watchers=[recorder]), 6)
+    recorder.close()
+
+    assert stream.getvalue().endswith(INDEX_MAGIC)
+    assert [kind for kind, record in records_of(stream)].count("game") == 2
+
+def test_log_reader_seeks_games_and_keyframes():
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, "games.log")
+        recorder = Recorder.open(path, keyframe_interval=2)
+        play_until_turn(land_game(watchers=[recorder]), 4)
+        play_until_turn(land_game(watchers=[recorder]), 8)
+        recorder.close()
+
+        reader = LogReader(path)
+        try:
+            assert len(reader) == 2
+            assert reader.keyframe_turns(0) == [3]
+            assert reader.keyframe_turns(1) == [3, 5, 7]
+
+            records = reader.read_game(1, from_turn=6)
+            assert [kind for kind, record in records[:2]] == ["game", "keyframe"]
+            assert records[0][1]["players"][0]["cards"][0]["name"] == "Forest"
+            assert records[1][1].turn == 5
+            assert min([record.turn for kind, record in records[2:]]) == 5
+            first_game = reader.read_game(0)
+            assert [kind for kind, record in first_game].count("game") == 1
+            assert [kind for kind, record in first_game].count("keyframe") == 1
+            assert first_game[-1][1].message == "recording_stopped"
+            assert first_game[-1][1].turn == 4
+        finally:
+            reader.close()
+    finally:
+        shutil.rmtree(directory)
+
+def test_log_reader_scans_logs_without_an_index():
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, "games.log")
+        recorder = Recorder.open(path, keyframe_interval=2)
+        play_until_turn(land_game(watchers=[recorder]), 4)
+        play_until_turn(land_game(watchers=[recorder]), 6)
+        recorder.stop()
+        recorder.flush()
+
+        reader = LogReader(path)
+        try:
+            assert len(reader) == 2
+            assert reader.keyframe_turns(1) == [3, 5]
+            assert reader.read_game(1, from_turn=5)[1][1].turn == 5
+        finally:
+            reader.close()
+        recorder.stream.close()
+    finally:
+        shutil.rmtree(directory)
@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+# Copyright Bernardo Heynemann <heynemann@gmail.com>
+
+# Licensed under the Open Software License ("OSL") v. 3.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.opensource.org/licenses/osl-3.0.php
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import json
+import zlib
+import shutil
+import tempfile
+from StringIO import StringIO
+
+from tests.unit.utils import *
+from libmagic import Game, Player
+from libmagic.simulation import play_first_playable_card, mixed_deck
+from libmagic.recording import Recorder, LogReader
+from libmagic.replay import read_games, load_game, replay, replay_file, replay_logs
+from libmagic.errors import ReplayError, InvalidOperationError
+
+decks = (mixed_deck("green"), mixed_deck("black"))
+
+def play_recorded_games(recorder, seeds, max_turns=6):
+    games = []
+    for seed in seeds:
+        game = Game(seed=seed)
+        game.add_player(Player(name="Bernardo", deck=decks[0]))
+        game.add_player(Player(name="John", deck=decks[1]))
+        recorder.watch(game)
+        game.initialize()
+        while game.turn <= max_turns:
+            play_first_playable_card(game, game.positions[game.current_position])
+            game.advance_to_next_decision()
+        games.append(game)
+    recorder.stop()
+    return games
+
+def recorded_log(seeds):
+    stream = StringIO()
+    recorder = Recorder(stream)
+    games = play_recorded_games(recorder, seeds)
+    recorder.flush()
+    return games, stream.getvalue()
+
+def test_replay_reaches_the_recorded_state():
+    games, log = recorded_log([1, 2])
+
+    recorded_games = list(read_games(StringIO(log)))
+
+    assert len(recorded_games) == 2
+    for game, recorded in zip(games, recorded_games):
+        replayed = replay(recorded)
+        assert replayed.hash == game.hash
+        assert replayed.compute_hash() == game.compute_hash()
+        assert replayed.turn == game.turn
+        assert [card.name for card in replayed.positions[0].battlefield] == \
+               [card.name for card in game.positions[0].battlefield]
+
+def test_replay_reaches_the_end_of_finished_games():
+    stream = StringIO()
+    recorder = Recorder(stream)
+    game = Game(seed=10)
+    game.add_player(Player(name="Bernardo", deck=decks[0]))
+    game.add_player(Player(name="John", deck=decks[1]))
+    recorder.watch(game)
+    game.initialize()
+    while not game.end_date:
+        play_first_playable_card(game, game.positions[game.current_position])
+        if game.turn == 3:
+            game.game_mode.set_hit_points_for("John", game.positions[1].hit_points - 11)
+            if game.end_date:
+                break
+        game.advance_to_next_decision()
+    recorder.stop()
+    recorder.flush()
+
+    recorded = list(read_games(StringIO(stream.getvalue())))[0]
+    replayed = replay(recorded)
+
+    assert game.winner is game.players[0]
+    assert replayed.winner is replayed.players[0]
+    assert replayed.end_date
+    assert replayed.positions[1].hit_points == -2
+    assert replayed.hash == game.hash
+
+def test_replay_follows_games_with_rolled_back_moves():
+    stream = StringIO()
+    recorder = Recorder(stream)
+    game = Game(seed=3, journal=True)
+    game.add_player(Player(name="Bernardo", deck=decks[0]))
+    game.add_player(Player(name="John", deck=decks[1]))
+    recorder.watch(game)
+    game.initialize()
+    while game.turn <= 4:
+        checkpoint = game.checkpoint()
+        play_first_playable_card(game, game.positions[game.current_position])
+        game.advance_to_next_decision()
+        if game.turn == 3:
+            game.rollback(checkpoint)
+            game.advance_to_next_decision()
+    recorder.stop()
+    recorder.flush()
+
+    recorded = list(read_games(StringIO(stream.getvalue())))[0]
+    replayed = replay(recorded)
+
+    assert replayed.hash == game.hash
+    assert replayed.compute_hash() == game.compute_hash()
+
+def test_replay_finishes_games_ended_by_their_driver():
+    stream = StringIO()
+    recorder = Recorder(stream)
+    game = land_game(watchers=[recorder])
+    game.move_to_next_step()
+    game.finish(winner=game.players[0])
+    recorder.stop()
+    recorder.flush()
+
+    replayed = replay(list(read_games(StringIO(stream.getvalue())))[0])
+
+    assert replayed.end_date
+    assert replayed.winner is replayed.players[0]
+    assert replayed.hash == game.hash
+
+def play_with_auto_pay(game, position):
+    if game.current_step.name != "main":
+        return
+    for card in list(position.hand):
+        try:
+            position.player.play(card, auto_pay=True)
+        except InvalidOperationError:
+            continue
+
+def test_replay_follows_games_played_with_auto_pay():
+    stream = StringIO()
+    recorder = Recorder(stream)
+    game = Game(seed=4)
+    game.add_player(Player(name="Bernardo", deck=decks[0]))
+    game.add_player(Player(name="John", deck=decks[1]))
+    recorder.watch(game)
+    game.initialize()
+    while game.turn <= 6:
+        play_with_auto_pay(game, game.positions[game.current_position])
+        game.advance_to_next_decision()
+    recorder.stop()
+    recorder.flush()
+
+    recorded = list(read_games(StringIO(stream.getvalue())))[0]
+    replayed = replay(recorded)
+
+    assert "mana_paid" in [event.message for event in recorded.events]
+    assert replayed.hash == game.hash
+    assert [card.name for card in replayed.positions[0].battlefield] == \
+           [card.name for card in game.positions[0].battlefield]
+
+def test_replay_follows_draws_and_zone_moves():
+    stream = StringIO()
+    recorder = Recorder(stream)
+    game = Game(seed=5)
+    game.add_player(Player(name="Bernardo", deck=decks[0]))
+    game.add_player(Player(name="John", deck=decks[1]))
+    recorder.watch(game)
+    game.initialize()
+    while game.turn <= 6:
+        position = game.positions[game.current_position]
+        position.draw(2)
+        play_first_playable_card(game, position)
+        position.move_card(position.hand[0], "graveyard")
+        if position.battlefield:
+            position.move_card(position.battlefield[0], "hand")
+        game.advance_to_next_decision()
+    recorder.stop()
+    recorder.flush()
+
+    recorded = list(read_games(StringIO(stream.getvalue())))[0]
+    replayed = replay(recorded)
+
+    messages = set([event.message for event in recorded.events])
+    assert set(["cards_drawn", "card_moved:graveyard", "card_moved:hand"]) <= messages
+    assert replayed.hash == game.hash
+    for replayed_position, position in zip(replayed.positions, game.positions):
+        for zone in ("hand", "battlefield", "graveyard"):
+            assert [card.index for card in replayed_position.zone(zone)] == \
+                   [card.index for card in position.zone(zone)]
+
+def test_replay_stops_at_the_requested_turn():
+    games, log = recorded_log([3])
+    recorded = list(read_games(StringIO(log)))[0]
+
+    replayed = replay(recorded, until_turn=3)
+
+    assert replayed.turn == 3
+    assert replayed.current_position == 0
+    assert len(replayed.positions[0].battlefield) < len(games[0].positions[0].battlefield)
+
+def test_replay_detects_diverging_games():
+    games, log = recorded_log([4])
+    recorded = list(read_games(StringIO(log)))[0]
+    recorded.events[2].hash ^= 1
+
+    assert_raises(ReplayError, replay, recorded, exc_pattern=r"diverged at event 2")
+    assert replay(recorded, verify=False).hash == games[0].hash
+
+def test_replay_requires_seeded_games():
+    games, log = recorded_log([5])
+    recorded = list(read_games(StringIO(log)))[0]
+    recorded.setup["seed"] = None
+
+    assert_raises(ReplayError, replay, recorded, exc_pattern=r"without a seed")
+
+def test_replay_logs_replays_files_in_parallel():
+    directory = tempfile.mkdtemp()
+    try:
+        paths = []
+        for seeds in ([1, 2], [3]):
+            path = os.path.join(directory, "games-%d.log" % seeds[0])
+            recorder = Recorder.open(path)
+            play_recorded_games(recorder, seeds)
+            recorder.close()
+            paths.append(path)
+
+        serial = replay_file(paths[0]) + replay_file(paths[1])
+        parallel = list(replay_logs(paths, workers=2))
+
+        assert [result.error for result in serial] == [None, None, None]
+        assert sorted([(result.source, result.index, result.turns) for result in parallel]) == \
+               sorted([(result.source, result.index, result.turns) for result in serial])
+    finally:
+        shutil.rmtree(directory)
+
+def keyframed_log(path, seeds, max_turns=9):
+    recorder = Recorder.open(path, keyframe_interval=3)
+    games = play_recorded_games(recorder, seeds, max_turns)
+    recorder.close()
+    return games
+
+def test_replay_starts_from_the_last_keyframe_before_the_turn():
+    games, log = recorded_log([6])
+    full = list(read_games(StringIO(log)))[0]
+    stream = StringIO()
+    recorder = Recorder(stream, keyframe_interval=3)
+    play_recorded_games(recorder, [6])
+    recorder.flush()
+    keyframed = list(read_games(StringIO(stream.getvalue())))[0]
+
+    assert [keyframe.turn for keyframe in keyframed.keyframes] == [4, 7]
+    for turn in (2, 4, 5, 6):
+        expected = replay(full, until_turn=turn)
+        replayed = replay(keyframed, until_turn=turn)
+        assert replayed.hash == expected.hash
+        assert replayed.compute_hash() == expected.compute_hash()
+        assert (replayed.turn, replayed.current_position, replayed.step_index) == \
+               (expected.turn, expected.current_position, expected.step_index)
+    assert replay(keyframed).hash == games[0].hash
+
+def test_log_reader_loads_games_from_a_keyframe():
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, "games.log")
+        games = keyframed_log(path, [7, 8])
+
+        reader = LogReader(path)
+        try:
+            whole = load_game(reader, 1)
+            recorded = load_game(reader, 1, from_turn=8)
+        finally:
+            reader.close()
+
+        assert recorded.first_event == recorded.keyframes[0].event > 0
+        assert recorded.keyframes[0].turn == 7
+        assert len(recorded.events) == len(whole.events) - recorded.first_event
+        assert replay(recorded, until_turn=8).hash == replay(whole, until_turn=8).hash
+        assert replay(recorded).hash == games[1].hash
+        assert_raises(ReplayError, replay, recorded, until_turn=5, exc_pattern=r"starts at event")
+    finally:
+        shutil.rmtree(directory)
+
+def test_replay_detects_corrupt_keyframes():
+    stream = StringIO()
+    recorder = Recorder(stream, keyframe_interval=3)
+    play_recorded_games(recorder, [9])
+    recorder.flush()
+    recorded = list(read_games(StringIO(stream.getvalue())))[0]
+    state = json.loads(zlib.decompress(recorded.keyframes[0].data))
+    state["positions"][0]["hand"].pop()
+    recorded.keyframes[0].data = zlib.compress(json.dumps(state))
+
+    assert_raises(ReplayError, replay, recorded, until_turn=5, exc_pattern=r"keyframe at turn 4")
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+# Copyright Bernardo Heynemann <heynemann@gmail.com>
+
+# Licensed under the Open Software License ("OSL") v. 3.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.opensource.org/licenses/osl-3.0.php
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+from copy import deepcopy
+
+from libmagic import Game, Player, Deck, Card, Land, Cost, InvalidOperationError, simulate, run_game, GameResult
+from libmagic.simulation import play_first_playable_card
+from tests.unit.utils import *
+import tests.unit.data as data
+
+def test_run_game_stops_at_max_turns():
+    winner, turns, duration = run_game((deepcopy(data.green_deck), deepcopy(data.black_deck)), max_turns=3)
+
+    assert winner is None
+    assert turns == 3
+    assert duration >= 0
+
+def test_run_game_finishes_games_that_reach_max_turns():
+    finished = []
+    def watch_game(game, position):
+        if not finished:
+            game.bus.subscribe("game_finished", lambda game, winner: finished.append((game.end_date, winner)))
+            finished.append(None)
+
+    winner, turns, duration = run_game((deepcopy(data.green_deck), deepcopy(data.black_deck)), agent=watch_game, max_turns=3)
+
+    assert winner is None
+    assert len(finished) == 2
+    assert finished[1][0] and finished[1][1] is None
+
+def test_run_game_reports_winner_index():
+    def concede(game, position):
+        game.game_mode.set_hit_points_for(game.players[1].name, 0)
+
+    winner, turns, duration = run_game((deepcopy(data.green_deck), deepcopy(data.black_deck)), agent=concede)
+
+    assert winner == 0
+    assert turns == 1
+
+def test_game_finishes_when_only_one_player_has_hit_points():
+    new_game = Game()
+    bernardo = Player(name="Bernardo", deck=deepcopy(data.green_deck))
+    john = Player(name="John", deck=deepcopy(data.black_deck))
+    new_game.add_player(bernardo)
+    new_game.add_player(john)
+    new_game.initialize()
+
+    new_game.game_mode.set_hit_points_for("John", 0)
+
+    assert new_game.end_date
+    assert new_game.winner is bernardo
+
+def test_finishing_a_finished_game_raises():
+    new_game = Game()
+    new_game.add_player(Player(name="Bernardo", deck=deepcopy(data.green_deck)))
+    new_game.add_player(Player(name="John", deck=deepcopy(data.black_deck)))
+    new_game.initialize()
+    new_game.finish()
+
+    assert_raises(InvalidOperationError, new_game.finish, exc_pattern=r"The game has already finished.")
+
+def test_simulate_in_process_yields_one_result_per_game():
+    matchups = [(data.green_deck, data.black_deck), (data.black_deck, data.green_deck)]
+    results = list(simulate(matchups, games=3, workers=1, max_turns=2))
+
+    assert len(results) == 6
+    assert all(isinstance(result, GameResult) for result in results)
+    assert sorted(result.index for result in results) == range(6)
+    assert [result.matchup for result in sorted(results, key=lambda result: result.index)] == [0, 0, 0, 1, 1, 1]
+
+def test_interleaved_in_process_runs_keep_their_own_matchups():
+    played = {"a": set(), "b": set()}
+    def record_decks(name):
+        def agent(game, position):
+            played[name].add((game, tuple([player.deck for player in game.players])))
+        return agent
+
+    run_a = simulate([(data.green_deck, data.black_deck)], games=2, workers=1, agent=record_decks("a"), max_turns=1)
+    run_b = simulate([(data.black_deck, data.green_deck)], games=2, workers=1, agent=record_decks("b"), max_turns=1)
+    for results in zip(run_a, run_b):
+        pass
+
+    assert len(played["a"]) == len(played["b"]) == 2
+    assert set([decks for game, decks in played["a"]]) == set([(data.green_deck, data.black_deck)])
+    assert set([decks for game, decks in played["b"]]) == set([(data.black_deck, data.green_deck)])
+
+def test_simulate_on_a_process_pool_yields_one_result_per_game():
+    results = list(simulate([(data.green_deck, data.black_deck)], games=4, workers=2, max_turns=2, chunksize=1))
+
+    assert sorted(result.index for result in results) == range(4)
+    assert all(result.turns == 2 for result in results)
+
+def test_simulate_raises_on_invalid_deck():
+    invalid_deck = Deck("invalid", [Card("Some card", Cost(green=1))] * 5)
+
+    assert_raises(InvalidOperationError, simulate, [(invalid_deck, data.black_deck)], workers=1,
+                  exc_pattern=r"There can be only 4 cards")
+
+def test_simulate_gives_every_game_its_own_seed():
+    results = list(simulate([(data.green_deck, data.black_deck)], games=3, workers=1, max_turns=2, seed=7))
+
+    assert len(set(result.seed for result in results)) == 3
+
+def test_simulate_without_seed_draws_a_run_seed():
+    results = list(simulate([(data.green_deck, data.black_deck)], games=2, workers=1, max_turns=2))
+    seeds = [result.seed for result in sorted(results, key=lambda result: result.index)]
+
+    assert None not in seeds
+    assert seeds[1] == seeds[0] + 1
+
+def played_game_hash(decks, seed):
+    game = Game(seed=seed)
+    for player_index, deck in enumerate(decks):
+        game.add_player(Player(name="Player %d" % (player_index + 1), deck=deck))
+    game.initialize()
+    while not game.end_date and game.turn <= 10:
+        play_first_playable_card(game, game.positions[game.current_position])
+        game.advance_to_next_decision()
+    return game.hash
+
+def test_games_played_in_threads_match_games_played_alone():
+    decks = (deepcopy(data.green_deck), deepcopy(data.black_deck))
+    expected = [played_game_hash(decks, seed) for seed in range(8)]
+
+    hashes = {}
+    def play(seed):
+        hashes[seed] = played_game_hash(decks, seed)
+    threads = [threading.Thread(target=play, args=(seed,)) for seed in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [hashes[seed] for seed in range(8)] == expected
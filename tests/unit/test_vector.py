@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+# Copyright Bernardo Heynemann <heynemann@gmail.com>
+
+# Licensed under the Open Software License ("OSL") v. 3.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.opensource.org/licenses/osl-3.0.php
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from nose.plugins.skip import SkipTest
+
+from libmagic import Game, Player, Deck, Card, Land, Cost, InvalidOperationError
+from libmagic.vector import VectorGame, NO_CARD, numpy
+from tests.unit.utils import *
+from libmagic.simulation import mixed_deck
+import tests.unit.data as data
+
+def setup():
+    if numpy is None:
+        raise SkipTest("numpy is not installed")
+
+green_deck = mixed_deck("green")
+black_deck = mixed_deck("black")
+
+def reference_games(count):
+    games = []
+    for seed in range(count):
+        game = Game(seed=seed)
+        game.add_player(Player(name="Bernardo", deck=green_deck))
+        game.add_player(Player(name="John", deck=black_deck))
+        game.initialize()
+        games.append(game)
+    return games
+
+def current_position(game):
+    return game.positions[game.current_position]
+
+def play_in_games(games, choose):
+    played = []
+    chosen = []
+    for game in games:
+        position = current_position(game)
+        if not position.hand:
+            chosen.append(NO_CARD)
+            played.append(False)
+            continue
+        card = choose(position)
+        chosen.append(card.index)
+        try:
+            position.player.play(card)
+            played.append(True)
+        except InvalidOperationError:
+            played.append(False)
+    return chosen, played
+
+def tap_in_games(games):
+    chosen = []
+    for game in games:
+        position = current_position(game)
+        lands = [card for card in position.battlefield if isinstance(card, Land) and not card.is_tapped]
+        if lands:
+            chosen.append(lands[0].index)
+            lands[0].GenerateManaAndTap()
+        else:
+            chosen.append(NO_CARD)
+    return chosen
+
+def first_in_hand(position):
+    return sorted(position.hand, key=lambda card: card.index)[0]
+
+def last_in_hand(position):
+    return sorted(position.hand, key=lambda card: card.index)[-1]
+
+def test_vector_game_loaded_from_games_matches_them():
+    games = reference_games(4)
+    vector = VectorGame.from_games(games)
+
+    assert vector.equals(VectorGame.from_games(games))
+    assert vector.cards_in("hand", 0, 0) == sorted(card.index for card in games[0].positions[0].hand)
+
+def step_like_reference_games(games):
+    vector = VectorGame.from_games(games)
+
+    for step in range(60):
+        if games[0].current_step.name == "main":
+            for choose in (first_in_hand, last_in_hand):
+                chosen, played = play_in_games(games, choose)
+                assert list(vector.play(chosen)) == played
+            tapped = tap_in_games(games)
+            assert list(vector.generate_mana(tapped)) == [card != NO_CARD for card in tapped]
+        for game in games:
+            game.move_to_next_step()
+        vector.move_to_next_step()
+
+        assert vector.equals(VectorGame.from_games(games)), "diverged at step %d" % step
+
+def test_vector_game_steps_like_the_reference_games():
+    step_like_reference_games(reference_games(6))
+
+def test_vector_game_skips_optional_steps_like_the_reference_games():
+    games = reference_games(3)
+    vector = VectorGame.from_games(games)
+
+    for step in range(10):
+        for game in games:
+            game.advance_to_next_decision()
+        vector.advance_to_next_decision()
+
+        assert vector.equals(VectorGame.from_games(games))
+
+def test_new_vector_game_starts_at_first_main_step():
+    vector = VectorGame((green_deck, black_deck), games=100, seed=3)
+
+    assert vector.step_index == 3
+    assert (vector.turn == 1).all()
+    assert ((vector.zone == 1).sum(axis=2) == 7).all()
+    assert (vector.library_cursor == 7).all()
+    assert (vector.hit_points == 20).all()
+
+def test_new_vector_games_are_reproducible():
+    vector_a = VectorGame((green_deck, black_deck), games=10, seed=3)
+    vector_b = VectorGame((green_deck, black_deck), games=10, seed=3)
+
+    assert vector_a.equals(vector_b)
+
+def test_vector_game_rejects_second_land_in_a_turn():
+    vector = VectorGame((data.green_land_deck, data.black_land_deck), games=1, seed=3)
+    lands = vector.cards_in("hand", 0, vector.current_position[0])
+
+    assert len(lands) == 7
+    assert vector.play([lands[0]])[0]
+    assert not vector.play([lands[1]])[0]
+
+def test_vector_game_refuses_unsupported_cards():
+    class Creature(Card):
+        pass
+
+    deck = Deck("creatures", [Creature("creature %d" % cnt, Cost()) for cnt in range(10)])
+    assert_raises(InvalidOperationError, VectorGame, (deck, deck), 1, exc_pattern=r"The vector engine only plays Card and Land, not Creature.")
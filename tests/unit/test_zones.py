@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+#-*- coding:utf-8 -*-
+
+# Copyright Bernardo Heynemann <heynemann@gmail.com>
+
+# Licensed under the Open Software License ("OSL") v. 3.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.opensource.org/licenses/osl-3.0.php
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from tests.unit.utils import *
+from libmagic import Zone, Card, Land, Cost
+
+def some_cards(count=5):
+    return [Card("some card %d" % cnt, Cost.empty()) for cnt in range(count)]
+
+def test_zone_keeps_cards_in_order():
+    cards = some_cards()
+    zone = Zone(cards)
+
+    assert list(zone) == cards
+    assert zone == cards
+    assert len(zone) == 5
+
+def test_zone_removes_cards_and_keeps_order():
+    cards = some_cards()
+    zone = Zone(cards)
+
+    zone.remove(cards[1])
+    zone.remove(cards[3])
+
+    assert zone == [cards[0], cards[2], cards[4]]
+    assert cards[1] not in zone
+    assert cards[2] in zone
+    assert len(zone) == 3
+    assert zone[1] is cards[2]
+    assert zone.index(cards[4]) == 2
+
+def test_zone_remove_raises_for_cards_not_in_zone():
+    cards = some_cards()
+    zone = Zone(cards[:2])
+    assert_raises(ValueError, zone.remove, cards[3], exc_pattern=r"card not in zone")
+
+def test_zone_inserts_cards_at_index():
+    cards = some_cards()
+    zone = Zone(cards[:3])
+    zone.remove(cards[0])
+
+    zone.insert(1, cards[4])
+
+    assert zone == [cards[1], cards[4], cards[2]]
+    assert zone.index(cards[2]) == 2
+
+def test_zone_supports_slices():
+    cards = some_cards()
+    zone = Zone(cards)
+
+    del zone[-2:]
+    assert zone == cards[:3]
+
+    zone[:] = cards[3:]
+    assert zone == cards[3:]
+    assert cards[0] not in zone
+    assert zone[:1] == [cards[3]]
+
+def test_zone_concatenates_with_lists():
+    cards = some_cards()
+    zone = Zone(cards[:2])
+
+    assert zone + cards[2:] == cards
+    assert cards[2:] + zone == cards[2:] + cards[:2]
+
+def test_zone_selects_cards_by_type_and_tapped_state():
+    lands = [Land("Forest %d" % cnt, "green") for cnt in range(3)]
+    cards = some_cards(2)
+    zone = Zone([lands[0], cards[0], lands[1], cards[1], lands[2]])
+
+    lands[1].is_tapped = True
+    zone.update(lands[1])
+
+    assert zone.select(Land) == lands
+    assert zone.select(Land, tapped=False) == [lands[0], lands[2]]
+    assert zone.select(tapped=True) == [lands[1]]
+    assert zone.select(Card, tapped=False) == [lands[0], cards[0], cards[1], lands[2]]
+
+    zone.remove(lands[0])
+    assert zone.select(Land, tapped=False) == [lands[2]]
+
+def test_battlefield_tracks_tapped_lands():
+    new_game = land_game(journal=True)
+    position = new_game.positions[new_game.current_position]
+    land = position.hand[0]
+    position.player.play(land)
+    checkpoint = new_game.checkpoint()
+
+    land.GenerateManaAndTap()
+
+    assert position.battlefield.select(Land, tapped=False) == []
+    assert position.battlefield.select(Land, tapped=True) == [land]
+
+    new_game.rollback(checkpoint)
+
+    assert position.battlefield.select(Land, tapped=False) == [land]
@@ -17,6 +17,10 @@
 
 import sys
 import re
+from copy import deepcopy
+
+from libmagic import Game, Player
+import tests.unit.data as data
 
 # Discussion
 #    assert_raises() adds two optional arguments: "exc_args" 
@@ -66,3 +70,14 @@ def assert_raises(exception, callable, *args, **kwargs):
     else:
         assert False, "%s did not raise %s" % (callsig, exception)
 
+
+def land_game(journal=False, watchers=()):
+    # A seeded game of two land decks; watchers (a MetricsRegistry, a
+    # Recorder...) start watching it before it is initialized.
+    new_game = Game(seed=1, journal=journal)
+    new_game.add_player(Player(name="Bernardo", deck=deepcopy(data.green_land_deck)))
+    new_game.add_player(Player(name="John", deck=deepcopy(data.black_land_deck)))
+    for watcher in watchers:
+        watcher.watch(new_game)
+    new_game.initialize()
+    return new_game